@@ -1,18 +1,117 @@
-from openai import OpenAI
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import profiler
 
 class OpenAIDataAssistant:
-    def __init__(self, api_token, open_ai_model="gpt-3.5-turbo"):
+    def __init__(self, api_token, open_ai_model="gpt-3.5-turbo", client=None,
+                 cache_dir=None, max_concurrency=4, max_retries=3, backoff_seconds=1.0):
+        """
+        :param api_token: OpenAI API token.
+        :param open_ai_model: Model used for the chat completions.
+        :param client: Object with the OpenAI client interface
+            (client.chat.completions.create). If None, a real OpenAI client is created.
+        :param cache_dir: Folder for the on-disk answers cache. If None, answers are not cached.
+        :param max_concurrency: Maximum number of requests sent at the same time, by
+            ask_insights or by several threads calling ask_insight (e.g. pipeline stages).
+        :param max_retries: Number of retries of a failed request.
+        :param backoff_seconds: Wait before the first retry, doubled on every retry.
+        """
         self.open_ai_api_token = api_token
-        self.client = OpenAI(api_key=self.open_ai_api_token)
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=self.open_ai_api_token)
+        self.client = client
         self.open_ai_model = open_ai_model
         self.role_system = "Eres un asistente que analiza datos y proporciona insights"
+        self.cache_dir = cache_dir
+        self.max_concurrency = max_concurrency
+        self.__request_slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
 
-    def ask_insight(self, question, temperature=0.4):
+    @staticmethod
+    def serialize_data(data):
+        """
+        Serializes the data sent with a question as compact JSON
+        (strings are sent as they are).
+        """
+        if data is None or isinstance(data, str):
+            return data
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+    def ask_insight(self, question, temperature=0.4, data=None):
+        """
+        Asks a single question, optionally with the data it is about.
+        Answers are read from / written to the cache when cache_dir is set.
+        """
+        data = self.serialize_data(data)
+        cache_path = self.__cache_path(question, data, temperature)
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as f:
+                return json.load(f)["answer"]
+        prompt = question if data is None else f"{question}: {data}"
+        with profiler.stage("ai.request", model=self.open_ai_model):
+            answer = self.__request_with_retries(prompt, temperature)
+        if cache_path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temporary file first, so concurrent runs never read half an answer
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"answer": answer}, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        return answer
+
+    def ask_insights(self, questions, temperature=0.4):
+        """
+        Asks several questions concurrently, with at most max_concurrency
+        requests in flight.
+
+        :param questions: list - Each item is either a question string or a dict
+            with the 'question' and (optionally) the 'data' keys.
+        :param temperature: Temperature for every request.
+        :return: list - The answers, in the same order as the questions.
+        """
+        def ask(question):
+            if isinstance(question, str):
+                return self.ask_insight(question, temperature=temperature)
+            return self.ask_insight(question["question"], temperature=temperature,
+                                    data=question.get("data"))
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return list(executor.map(ask, questions))
+
+    def __cache_path(self, question, data, temperature):
+        if self.cache_dir is None:
+            return None
+        key = json.dumps([self.open_ai_model, self.role_system, question, data, temperature],
+                         ensure_ascii=False)
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def __request_with_retries(self, prompt, temperature):
+        for attempt in range(self.max_retries + 1):
+            try:
+                # The slot is released while waiting to retry
+                with self.__request_slots:
+                    return self.__request(prompt, temperature)
+            except Exception as error:
+                status_code = getattr(error, "status_code", None)
+                # Client errors (bad request, wrong token...) will fail again,
+                # except rate limits
+                is_retryable = status_code is None or status_code == 429 or status_code >= 500
+                if not is_retryable or attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_seconds * 2 ** attempt)
+
+    def __request(self, prompt, temperature):
         response = self.client.chat.completions.create(
             model=self.open_ai_model,
             messages=[
                 {"role": "system", "content": self.role_system},
-                {"role": "user", "content": question}
+                {"role": "user", "content": prompt}
             ],
             temperature=temperature
         )
@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+from instrumentation import profiler
+from stats_calculator import DEFAULT_PERCENTILES, summarize_bands
+
+class FormAnalytics:
+    """
+    Form and trend metrics on the round x team matrices of a
+    PointsStatsCalculator. Every metric is a rounds x teams array, with
+    rows in the calculator's round order:
+    - rolling_mean / rolling_std: mean and standard deviation of the round
+      points in the last `window` rounds (fewer at the start of the season).
+    - streak: consecutive rounds scoring at least the round's mean points
+      (positive) or below it (negative), up to each round.
+    - position_change: positions gained (positive) or lost since the previous round.
+    - gap_to_leader: points behind the leader after each round.
+    Plus head_to_head[i, j], the number of rounds team i scored more than team j.
+    When rounds are appended to the calculator, update() only computes the new ones.
+    Rounds are processed in chunks of the calculator's chunk_cells; in big
+    leagues (keep_metrics=False) only the last round of each metric and their
+    band summaries are kept, so the memory does not grow with the league.
+    """
+    METRICS = ["rolling_mean", "rolling_std", "streak", "position_change", "gap_to_leader"]
+
+    def __init__(self, calculator, window=5, with_head_to_head=True, keep_metrics=True):
+        """
+        :param calculator: PointsStatsCalculator - Source of the round x team matrices.
+        :param window: int - Number of rounds of the rolling metrics.
+        :param with_head_to_head: bool - If False, head_to_head is not computed (it
+            is a teams x teams matrix, too big for leagues with thousands of teams).
+        :param keep_metrics: bool - If False, the metric attributes are None: only
+            get_summary() and get_metric_band_data() (with its default arguments)
+            are available.
+        """
+        self.calculator = calculator
+        self.window = window
+        self.with_head_to_head = with_head_to_head
+        self.keep_metrics = keep_metrics
+        self.__reset()
+        self.update()
+
+    def __reset(self):
+        n_teams = len(self.calculator.teams)
+        self.n_teams = n_teams
+        self.rounds = np.empty(0, dtype=np.int64)
+        for metric in self.METRICS:
+            setattr(self, metric, np.empty((0, n_teams), dtype=np.float64
+                                           if metric.startswith("rolling") else np.int64)
+                    if self.keep_metrics else None)
+        # Last round of every metric, and band summaries when the metrics are not kept
+        self.__last = None
+        self.__bands = None
+        self.__highlighted = None
+        if not self.keep_metrics:
+            self.__highlighted = self.calculator.get_highlighted_teams()
+            self.__bands = {metric: None for metric in self.METRICS}
+        self.head_to_head = None
+        if self.with_head_to_head:
+            self.head_to_head = np.zeros((n_teams, n_teams), dtype=np.int64)
+
+    @profiler.timed("analytics.update")
+    def update(self):
+        """
+        Computes the metrics of the rounds added to the calculator since the
+        last call. If the calculator was rebuilt with different rounds, or
+        teams (or, without keep_metrics, the highlighted teams changed),
+        everything is computed again.
+        """
+        calculator = self.calculator
+        n_known = len(self.rounds)
+        if (self.n_teams != len(calculator.teams)
+                or not np.array_equal(calculator.rounds[:n_known], self.rounds)
+                or (self.__highlighted is not None and not np.array_equal(
+                    calculator.get_highlighted_teams(), self.__highlighted))):
+            self.__reset()
+            n_known = 0
+        n_rounds = len(calculator.rounds)
+        chunk_rows = max(calculator.chunk_cells // max(self.n_teams, 1), 1)
+        for start in range(n_known, n_rounds, chunk_rows):
+            rows = slice(start, min(start + chunk_rows, n_rounds))
+            metrics = self.__compute_rows(rows)
+            # Copies, the views would keep the whole chunk alive
+            self.__last = {metric: values[-1].copy() for metric, values in metrics.items()}
+            if self.keep_metrics:
+                for metric, values in metrics.items():
+                    setattr(self, metric, np.concatenate([getattr(self, metric), values]))
+                continue
+            for metric, values in metrics.items():
+                bands = summarize_bands(calculator.rounds[rows], calculator.teams, values,
+                                        self.__highlighted, chunk_cells=calculator.chunk_cells)
+                self.__bands[metric] = self.__merge_bands(self.__bands[metric], bands)
+        self.rounds = np.array(calculator.rounds)
+
+    def __compute_rows(self, rows):
+        # Metrics of the given rows, reading only them (and the previous window) from the calculator
+        calculator = self.calculator
+        context_start = max(rows.start - self.window + 1, 0)
+        points = np.asarray(calculator.round_points[context_start:rows.stop], dtype=np.float64)
+        new_points = points[rows.start - context_start:]
+
+        # Rolling mean and std from cumulative sums: O(teams) per round.
+        # Window of row r: rows [start, r], and window sum = cumsum[r + 1] - cumsum[start]
+        zeros = np.zeros((1, points.shape[1]))
+        points_cumsum = np.concatenate([zeros, np.cumsum(points, axis=0)])
+        squares_cumsum = np.concatenate([zeros, np.cumsum(points ** 2, axis=0)])
+        row_numbers = np.arange(rows.start, rows.stop)
+        starts = np.maximum(row_numbers - self.window + 1, 0)
+        window_sizes = (row_numbers - starts + 1)[:, np.newaxis]
+        window_points = points_cumsum[row_numbers + 1 - context_start] - points_cumsum[starts - context_start]
+        window_squares = squares_cumsum[row_numbers + 1 - context_start] - squares_cumsum[starts - context_start]
+        rolling_mean = window_points / window_sizes
+        rolling_std = np.sqrt(np.maximum(window_squares / window_sizes - rolling_mean ** 2, 0))
+
+        # Position changes and gap to the leader
+        positions = np.asarray(calculator.positions[max(rows.start - 1, 0):rows.stop])
+        position_change = np.zeros(new_points.shape, dtype=np.int64)
+        if rows.start:
+            position_change = positions[:-1] - positions[1:]
+        else:
+            position_change[1:] = positions[:-1] - positions[1:]
+        aggregated_points = np.asarray(calculator.aggregated_points[rows])
+        gap_to_leader = aggregated_points.max(axis=1, keepdims=True) - aggregated_points
+
+        # Streaks and head to head depend on the previous round, one round at a time
+        streak = np.empty(new_points.shape, dtype=np.int64)
+        previous_streak = (self.__last["streak"] if self.__last is not None
+                           else np.zeros(new_points.shape[1], dtype=np.int64))
+        for row, round_points in enumerate(new_points):
+            is_good = round_points >= round_points.mean()
+            previous_streak = np.where(
+                is_good,
+                np.where(previous_streak > 0, previous_streak + 1, 1),
+                np.where(previous_streak < 0, previous_streak - 1, -1)
+            )
+            streak[row] = previous_streak
+            if self.head_to_head is not None:
+                self.head_to_head += round_points[:, np.newaxis] > round_points[np.newaxis, :]
+        return {"rolling_mean": rolling_mean, "rolling_std": rolling_std, "streak": streak,
+                "position_change": position_change, "gap_to_leader": gap_to_leader}
+
+    @staticmethod
+    def __merge_bands(bands, new_bands):
+        if bands is None:
+            return new_bands
+        bands["rounds"].extend(new_bands["rounds"])
+        for group in ("percentiles", "teams"):
+            for key, values in new_bands[group].items():
+                bands[group][key].extend(values)
+        return bands
+
+    def get_metric_data(self, metric):
+        """
+        Returns a metric in long format, ready for Graficator.plot_lines.
+
+        :param metric: str - One of FormAnalytics.METRICS.
+        :return: pd.DataFrame - Columns 'round', 'player' and the metric.
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if not self.keep_metrics:
+            raise ValueError("The metrics are not kept (keep_metrics=False), use get_metric_band_data()")
+        values = getattr(self, metric)
+        n_teams = values.shape[1]
+        return pd.DataFrame({
+            "round": np.repeat(self.rounds, n_teams),
+            "player": np.tile(np.asarray(self.calculator.teams, dtype=object), len(self.rounds)),
+            metric: values.ravel()
+        }, columns=["round", "player", metric])
+
+    def get_metric_band_data(self, metric, n_highlight=5, percentiles=DEFAULT_PERCENTILES):
+        """
+        Summarizes a metric for Graficator.plot_bands: its percentile bands
+        over all teams, plus the first and last n_highlight teams of the standings.
+
+        :param metric: str - One of FormAnalytics.METRICS.
+        :return: dict - See stats_calculator.summarize_bands().
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if not self.keep_metrics:
+            if n_highlight != 5 or tuple(percentiles) != DEFAULT_PERCENTILES:
+                raise ValueError("Without keep_metrics, only the default bands are kept")
+            return self.__bands[metric]
+        return summarize_bands(self.rounds, self.calculator.teams, getattr(self, metric),
+                               self.calculator.get_highlighted_teams(n_highlight), percentiles)
+
+    def get_head_to_head_data(self):
+        """
+        :return: pd.DataFrame - Teams x teams, rounds the row team scored more than the column team.
+        """
+        return pd.DataFrame(self.head_to_head, index=self.calculator.teams,
+                            columns=self.calculator.teams)
+
+    def get_summary(self):
+        """
+        Returns the current form of every team in a compact, columnar form,
+        sorted by the current standings (e.g. to send it to an AI model).
+        Position changes are summed over the last `window` rounds.
+
+        :return: dict - Lists per metric, plus the 'team' list.
+        """
+        if not len(self.rounds):
+            return {}
+        standings = np.asarray(self.calculator.standings[-1])
+        # The position changes of the last rounds add up to the change since the round before them
+        positions = self.calculator.positions
+        position_change = (np.asarray(positions[max(len(self.rounds) - self.window - 1, 0)])
+                           - np.asarray(positions[-1]))
+        return {
+            "window": self.window,
+            "team": [self.calculator.teams[team_index] for team_index in standings.tolist()],
+            "rolling_mean": np.round(self.__last["rolling_mean"][standings], 1).tolist(),
+            "rolling_std": np.round(self.__last["rolling_std"][standings], 1).tolist(),
+            "streak": self.__last["streak"][standings].tolist(),
+            "position_change": position_change[standings].tolist(),
+            "gap_to_leader": self.__last["gap_to_leader"][standings].tolist(),
+        }
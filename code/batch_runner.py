@@ -0,0 +1,153 @@
+import os
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dotenv import load_dotenv
+from main import archive_season, generate_league_report
+
+
+def find_leagues(leagues_dir):
+    """
+    Looks for league datasets inside a directory. Every subfolder with a
+    'points.csv' file (directly or inside a 'dataset' folder) is a league,
+    named after the subfolder.
+
+    :param leagues_dir: str - Directory with one subfolder per league.
+    :return: list - Dicts with the 'name', 'points_csv_path' and
+        'market_csv_path' (None if there is no 'market.csv') of each league.
+    """
+    leagues = []
+    for name in sorted(os.listdir(leagues_dir)):
+        league_dir = os.path.join(leagues_dir, name)
+        if not os.path.isdir(league_dir):
+            continue
+        for dataset_dir in (league_dir, os.path.join(league_dir, "dataset")):
+            points_csv_path = os.path.join(dataset_dir, "points.csv")
+            if os.path.isfile(points_csv_path):
+                market_csv_path = os.path.join(dataset_dir, "market.csv")
+                leagues.append({
+                    "name": name,
+                    "points_csv_path": points_csv_path,
+                    "market_csv_path": market_csv_path if os.path.isfile(market_csv_path) else None
+                })
+                break
+    return leagues
+
+
+def run_league(league, output_dir, include_market_data=False, open_ai_api_token=None,
+               archive_path=None, season=None, finished=False):
+    """
+    Generates the report of a single league, and archives its season if
+    archive_path and season are given (see run_batch). Any error is caught and returned
+    in the result, so a bad league does not stop the rest of the batch.
+
+    :return: dict - League name, status ('ok' or 'error'), elapsed seconds,
+        report path and error traceback (if any).
+    """
+    start = time.perf_counter()
+    result = {"name": league["name"], "status": "ok", "seconds": None,
+              "report_path": None, "error": None}
+    try:
+        result["report_path"] = generate_league_report(
+            points_csv_path=league["points_csv_path"],
+            output_dir=output_dir,
+            market_csv_path=league["market_csv_path"] if include_market_data else None,
+            open_ai_api_token=open_ai_api_token
+        )
+        if archive_path is not None and season is not None:
+            archive_season(league["points_csv_path"], output_dir, archive_path,
+                           league["name"], season, finished=finished)
+    except Exception:
+        result["status"] = "error"
+        result["error"] = traceback.format_exc()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_batch(leagues_dir, output_dir=None, workers=None, include_market_data=False,
+              open_ai_api_token=None, archive_path=None, season=None, finished=False):
+    """
+    Generates one report per league found in leagues_dir, running the leagues
+    in parallel with a process pool.
+
+    :param leagues_dir: str - Directory with one subfolder per league.
+    :param output_dir: str - Root folder for the generated files. Each league
+        writes into '<output_dir>/<league name>'. Defaults to a
+        'generated_files' folder inside each league folder.
+    :param workers: int - Number of worker processes (default: number of CPUs).
+    :param include_market_data: bool - Include market data when a league has it.
+    :param open_ai_api_token: str - OpenAI API token for the AI insights.
+    :param archive_path: str - SQLite archive where each league's season is stored
+        (see season_archive). If None, nothing is archived.
+    :param season: str - Season name in the archive (e.g. '2025-26').
+    :param finished: bool - Whether the archived season is over (only then
+        the leaders count as titles).
+    :return: list - Result dict of each league, in the order they were found.
+    """
+    leagues = find_leagues(leagues_dir)
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for league in leagues:
+            if output_dir is None:
+                league_output_dir = os.path.join(leagues_dir, league["name"], "generated_files")
+            else:
+                league_output_dir = os.path.join(output_dir, league["name"])
+            future = executor.submit(run_league, league, league_output_dir,
+                                     include_market_data, open_ai_api_token,
+                                     archive_path, season, finished)
+            futures[future] = league["name"]
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception:
+                # The worker process itself died (e.g. killed by the OS)
+                results[name] = {"name": name, "status": "error", "seconds": None,
+                                 "report_path": None, "error": traceback.format_exc()}
+    return [results[league["name"]] for league in leagues]
+
+
+def format_summary(results):
+    lines = [f"{'Liga':<30} {'Estado':<8} {'Segundos':>9}"]
+    for result in results:
+        seconds = f"{result['seconds']:.2f}" if result["seconds"] is not None else "-"
+        lines.append(f"{result['name']:<30} {result['status']:<8} {seconds:>9}")
+    failed = sum(result["status"] != "ok" for result in results)
+    lines.append(f"\n{len(results) - failed} informes generados, {failed} con errores")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Generates one report per league.")
+    parser.add_argument("leagues_dir", help="Directory with one subfolder per league")
+    parser.add_argument("--output-dir", default=None,
+                        help="Root folder for the generated files (default: each league folder)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--archive-path", default=os.getenv("ARCHIVE_PATH"),
+                        help="SQLite archive where each league's season is stored "
+                             "(default: ARCHIVE_PATH env var)")
+    parser.add_argument("--season", default=None,
+                        help="Season name in the archive (e.g. 2025-26). "
+                             "Without it, nothing is archived")
+    parser.add_argument("--finished", action="store_true",
+                        help="The archived season is over: the leaders count as titles")
+    args = parser.parse_args()
+
+    batch_results = run_batch(
+        args.leagues_dir,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        include_market_data=str(os.getenv('INCLUDE_MARKET_DATA')).lower() == "true",
+        open_ai_api_token=os.getenv('OPEN_AI_API_TOKEN'),
+        archive_path=args.archive_path,
+        season=args.season,
+        finished=args.finished
+    )
+    for batch_result in batch_results:
+        if batch_result["error"]:
+            print(f"Error en la liga {batch_result['name']}:\n{batch_result['error']}")
+    print(format_summary(batch_results))
@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_SIZES = "10x38,100x100"
+
+
+def generate_league(dataset_dir, n_teams, n_rounds, seed=0):
+    """
+    Writes a synthetic points.csv and market.csv with the given number of
+    teams and rounds. Rows of points.csv are shuffled, like real exports
+    sometimes are.
+
+    :param dataset_dir: str - Folder where the CSV files are written.
+    :return: tuple - Paths of the points and market CSV files.
+    """
+    import numpy as np
+    import pandas as pd
+    from data_loader import SPANISH_MONTHS
+
+    rng = np.random.default_rng(seed)
+    teams = [f"Equipo {i + 1}" for i in range(n_teams)]
+    os.makedirs(dataset_dir, exist_ok=True)
+
+    skill = rng.normal(50, 8, n_teams)
+    points = np.clip(rng.normal(skill, 15, (n_rounds, n_teams)), 0, None).round().astype(np.int64)
+    points_df = pd.DataFrame(points, columns=teams)
+    points_df.insert(0, "Jornada", [f"J{i + 1}" for i in range(n_rounds)])
+    points_df = points_df.sample(frac=1, random_state=seed)
+    points_csv_path = os.path.join(dataset_dir, "points.csv")
+    points_df.to_csv(points_csv_path, sep=";", index=False, encoding="utf-8")
+
+    month_names = [name.capitalize() for name in SPANISH_MONTHS if name != "setiembre"]
+    n_months = max(n_rounds // 4, 1)
+    months = [f"{month_names[(6 + i) % 12]} {2025 + (6 + i) // 12}" for i in range(n_months)]
+    market_df = pd.DataFrame(rng.poisson(10, (n_months, n_teams)), columns=teams)
+    market_df.insert(0, "Mes", months)
+    market_csv_path = os.path.join(dataset_dir, "market.csv")
+    market_df.to_csv(market_csv_path, sep=";", index=False, encoding="utf-8")
+    return points_csv_path, market_csv_path
+
+
+def run_size(n_teams, n_rounds, track_memory=False):
+    """
+    Runs the report stages on a synthetic league, the same way the report
+    does (so leagues with more than main.BIG_LEAGUE_TEAMS teams run in big
+    league mode). It is meant to run in a fresh process, so the peak RSS
+    belongs to this league size only.
+
+    :return: dict - Size and per stage seconds, throughput (round x team
+        cells per second) and memory.
+    """
+    from instrumentation import profiler, get_peak_rss_mb
+    from main import (compute_stats, compute_market_data, compute_form_analytics,
+                      compute_projection, get_text_rounds, get_chart_spec, get_ai_question)
+    from market_analytics import MarketAnalytics
+    from graficator import Graficator
+    from pdf_converter import PDFPresentation
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        points_csv_path, market_csv_path = generate_league(
+            os.path.join(tmp_dir, "dataset"), n_teams, n_rounds
+        )
+        output_dir = os.path.join(tmp_dir, "generated_files")
+        profiler.reset(track_memory=track_memory)
+        calculator = compute_stats(points_csv_path, output_dir)
+        market_data = compute_market_data(market_csv_path, output_dir)
+        with profiler.stage("stats.text_rounds"):
+            text_rounds = get_text_rounds(calculator)
+        form_analytics = compute_form_analytics(calculator)
+        projection = compute_projection(calculator, total_rounds=2 * n_rounds)
+        with profiler.stage("market.analytics"):
+            market_analytics = MarketAnalytics(market_data, calculator)
+        with profiler.stage("ai.prompt_data"):
+            for kind, sources in (("highlights", [calculator]), ("trends", [form_analytics]),
+                                  ("prediction", [calculator, projection]),
+                                  ("market", [market_analytics])):
+                get_ai_question(kind, *sources)
+        calculator.export_json(os.path.join(output_dir, "points_stats.jsonl"), json_format="jsonl")
+        graficator = Graficator(output_dir=tmp_dir, use_cache=False, save_to_disk=False)
+        images = []
+        for chart, source in (("position", calculator), ("points", calculator),
+                              ("form", form_analytics), ("projection", projection),
+                              ("market", market_data)):
+            if source is None:
+                continue
+            with profiler.stage(f"chart_data.{chart}"):
+                spec = get_chart_spec(chart, source)
+            images.append(getattr(graficator, spec["plot"])(**spec["kwargs"]))
+        pdf = PDFPresentation(os.path.join(tmp_dir, "league_report.pdf"))
+        for image in images:
+            pdf.add_image_slide(image)
+        for text in text_rounds:
+            pdf.add_text_slide(text)
+        pdf.save()
+        report = profiler.report()
+
+    cells = n_teams * n_rounds
+    stages = {}
+    for record in report["stages"]:
+        stage = stages.setdefault(record["stage"], {"seconds": 0.0, "peak_rss_growth_mb": 0.0})
+        stage["seconds"] += record["seconds"]
+        stage["peak_rss_growth_mb"] += record.get("peak_rss_growth_mb") or 0.0
+        if "peak_traced_mb" in record:
+            stage["peak_traced_mb"] = max(stage.get("peak_traced_mb", 0.0), record["peak_traced_mb"])
+    for stage in stages.values():
+        stage["cells_per_second"] = cells / stage["seconds"] if stage["seconds"] else None
+    return {
+        "size": f"{n_teams}x{n_rounds}",
+        "teams": n_teams,
+        "rounds": n_rounds,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "stages": stages,
+    }
+
+
+def merge_runs(runs):
+    """
+    Merges several runs of the same league size, keeping the median of every
+    measure, so a single slow run (e.g. a busy machine) does not count.
+
+    :param runs: list - Results of run_size() for the same size.
+    :return: dict - Like a run_size() result, plus the number of 'repeats'.
+    """
+    def median(values):
+        values = [value for value in values if value is not None]
+        return statistics.median(values) if values else None
+
+    merged = {key: runs[0][key] for key in ("size", "teams", "rounds")}
+    merged["repeats"] = len(runs)
+    merged["peak_rss_mb"] = median([run["peak_rss_mb"] for run in runs])
+    merged["stages"] = {}
+    for name in runs[0]["stages"]:
+        stage_runs = [run["stages"][name] for run in runs if name in run["stages"]]
+        merged["stages"][name] = {key: median([stage.get(key) for stage in stage_runs])
+                                  for key in stage_runs[0]}
+    return merged
+
+
+def run_benchmarks(sizes, track_memory=False, repeats=3):
+    """
+    Runs the benchmark of every league size, each run in its own process.
+
+    :param sizes: list - (teams, rounds) tuples.
+    :param repeats: int - Runs of each size, merged with merge_runs().
+    :return: list - Merged results of every size, in the same order.
+    """
+    results = []
+    for n_teams, n_rounds in sizes:
+        runs = []
+        for _ in range(repeats):
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                runs.append(executor.submit(run_size, n_teams, n_rounds, track_memory).result())
+        results.append(merge_runs(runs))
+    return results
+
+
+def find_regressions(results, baseline, tolerance=0.25, min_seconds=0.05,
+                     memory_tolerance=0.25, min_mb=20.0):
+    """
+    Compares the results with a baseline run: the seconds of every stage, the
+    peak RSS of every league size and the part of it each stage adds. A
+    measure only regresses if it is worse by both the relative tolerance
+    and the absolute minimum, so the noise of millisecond stages does not count.
+
+    :param tolerance: float - Allowed slowdown (0.25 means 25% slower).
+    :param min_seconds: float - Smallest slowdown, in seconds, that counts.
+    :param memory_tolerance: float - Allowed memory growth (0.25 means 25% more).
+    :param min_mb: float - Smallest memory growth, in MB, that counts.
+    :return: list - Human readable description of each regression.
+    """
+    def is_worse(value, baseline_value, relative, absolute):
+        return (value is not None and baseline_value is not None
+                and value - baseline_value > max(baseline_value * relative, absolute))
+
+    baseline_by_size = {result["size"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        baseline_result = baseline_by_size.get(result["size"])
+        if baseline_result is None:
+            continue
+        if is_worse(result["peak_rss_mb"], baseline_result.get("peak_rss_mb"), memory_tolerance, min_mb):
+            regressions.append(f"{result['size']} peak RSS: {result['peak_rss_mb']:.0f} MB vs "
+                               f"{baseline_result['peak_rss_mb']:.0f} MB")
+        for name, stage in result["stages"].items():
+            baseline_stage = baseline_result["stages"].get(name)
+            if baseline_stage is None:
+                continue
+            if is_worse(stage["seconds"], baseline_stage["seconds"], tolerance, min_seconds):
+                regressions.append(
+                    f"{result['size']} {name}: {stage['seconds']:.4f}s vs "
+                    f"{baseline_stage['seconds']:.4f}s ({stage['seconds'] / baseline_stage['seconds']:.2f}x)"
+                )
+            for key, label in (("peak_rss_growth_mb", "RSS growth"), ("peak_traced_mb", "traced memory")):
+                if is_worse(stage.get(key), baseline_stage.get(key), memory_tolerance, min_mb):
+                    regressions.append(f"{result['size']} {name} {label}: {stage[key]:.0f} MB vs "
+                                       f"{baseline_stage[key]:.0f} MB")
+    return regressions
+
+
+def format_results(results):
+    lines = []
+    for result in results:
+        lines.append(f"\n{result['size']} (peak RSS {result['peak_rss_mb']:.0f} MB, "
+                     f"median of {result.get('repeats', 1)} runs)")
+        lines.append(f"  {'Stage':<32} {'Seconds':>10} {'Cells/s':>14} {'+RSS MB':>8}")
+        for name, stage in result["stages"].items():
+            throughput = f"{stage['cells_per_second']:.0f}" if stage["cells_per_second"] else "-"
+            lines.append(f"  {name:<32} {stage['seconds']:>10.4f} {throughput:>14} "
+                         f"{stage['peak_rss_growth_mb']:>8.0f}")
+    return "\n".join(lines)
+
+
+def parse_sizes(text):
+    sizes = []
+    for size in text.split(","):
+        n_teams, n_rounds = size.lower().split("x")
+        sizes.append((int(n_teams), int(n_rounds)))
+    return sizes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the pipeline stages on synthetic leagues.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"Comma separated TEAMSxROUNDS league sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--track-memory", action="store_true",
+                        help="Also measure the peak Python memory of each stage (slower, do not compare with untracked runs)")
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    parser.add_argument("--baseline", default=None,
+                        help="JSON results of a previous run to check for regressions")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Runs of each size, their median is kept (default: 3)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown against the baseline (default: 0.25)")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Smallest slowdown, in seconds, that is a regression (default: 0.05)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25,
+                        help="Allowed memory growth against the baseline (default: 0.25)")
+    parser.add_argument("--min-mb", type=float, default=20.0,
+                        help="Smallest memory growth, in MB, that is a regression (default: 20)")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmarks(parse_sizes(args.sizes), track_memory=args.track_memory,
+                                       repeats=args.repeats)
+    print(format_results(benchmark_results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(benchmark_results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(benchmark_results, json.load(f), args.tolerance,
+                                           args.min_seconds, args.memory_tolerance, args.min_mb)
+        if regressions:
+            print("\nRegressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
@@ -0,0 +1,246 @@
+import os
+import hashlib
+import zipfile
+import itertools
+import threading
+import importlib.util
+import numpy as np
+import pandas as pd
+from instrumentation import profiler
+
+POINTS_LABEL_COLUMN = "Jornada"
+MARKET_LABEL_COLUMN = "Mes"
+
+SPANISH_MONTHS = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6,
+    "julio": 7, "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10,
+    "noviembre": 11, "diciembre": 12
+}
+
+# The pyarrow CSV engine is much faster, but it is an optional dependency
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") is not None else "c"
+
+# Arrays of a binary snapshot of a parsed CSV
+SNAPSHOT_FIELDS = ("labels", "teams", "matrix", "mtime_ns", "size", "sha256")
+
+# CSV cells parsed at once by load_points_chunked() (each one is a Python string for a while)
+DEFAULT_CHUNK_CELLS = 1 << 18
+
+
+def parse_round_labels(round_labels):
+    """
+    Parses round labels such as 'J6' into their integer round numbers.
+
+    :param round_labels: pd.Series - Column with the round labels.
+    :return: np.ndarray - Integer round numbers, in the same order.
+    """
+    numbers = round_labels.astype(str).str.extract(r"^\s*[Jj](\d+)\s*$", expand=False)
+    invalid = numbers.isna()
+    if invalid.any():
+        raise ValueError(f"Invalid round labels: {round_labels[invalid].tolist()[:5]}")
+    return numbers.astype(np.int64).to_numpy()
+
+
+def parse_month_labels(month_labels):
+    """
+    Parses Spanish month labels such as 'Septiembre 2025' into months.
+
+    :param month_labels: pd.Series - Column with the month labels.
+    :return: np.ndarray - Months as numpy datetime64[M], in the same order.
+    """
+    parts = month_labels.astype(str).str.extract(r"^\s*(\w+)\s+(\d{4})\s*$")
+    month_numbers = parts[0].str.lower().map(SPANISH_MONTHS)
+    invalid = month_numbers.isna() | parts[1].isna()
+    if invalid.any():
+        raise ValueError(f"Invalid month labels: {month_labels[invalid].tolist()[:5]}")
+    years = parts[1].astype(np.int64).to_numpy()
+    return ((years - 1970) * 12 + month_numbers.astype(np.int64).to_numpy() - 1).astype("datetime64[M]")
+
+
+def load_points(csv_path, cache_dir=None):
+    """
+    Loads a points CSV ('Jornada' column plus one column per team).
+
+    :param csv_path: str - Path to the CSV points per round file.
+    :param cache_dir: str - Folder for the binary snapshots. If None, the CSV is always parsed.
+    :return: tuple - (rounds, teams, round_points), with the round numbers, the team
+        names and the round x team points matrix, in the file order.
+    """
+    return _load(csv_path, cache_dir, "points", POINTS_LABEL_COLUMN, parse_round_labels)
+
+
+def load_points_chunked(csv_path, matrix_path, chunk_cells=DEFAULT_CHUNK_CELLS):
+    """
+    Loads a points CSV like load_points(), for leagues too big to hold it in
+    memory: rows are parsed in chunks of about chunk_cells cells and written
+    to a raw binary file, which is memory-mapped.
+
+    :param csv_path: str - Path to the CSV points per round file.
+    :param matrix_path: str - Path of the binary file with the points matrix
+        (overwritten). It must exist while the returned matrix is used.
+    :param chunk_cells: int - CSV cells parsed at once.
+    :return: tuple - (rounds, teams, round_points), like load_points(), with a
+        read-only memory-mapped round_points.
+    """
+    with profiler.stage("csv.points"):
+        teams = list(read_header(csv_path, POINTS_LABEL_COLUMN)[1:])
+        chunk_rows = max(chunk_cells // len(teams), 1)
+        rounds = []
+        # pandas is slow with thousands of columns: each chunk of rows is split
+        # and converted by numpy at once
+        with open(csv_path, encoding="utf-8") as csv_file, open(matrix_path, "wb") as f:
+            next(csv_file)
+            while True:
+                lines = list(itertools.islice(csv_file, chunk_rows))
+                if not lines:
+                    break
+                lines = [line.rstrip("\r\n") for line in lines if line.strip()]
+                if not lines:
+                    continue
+                labels, _, values = zip(*(line.partition(";") for line in lines))
+                cells = np.array(";".join(values).split(";"))
+                if len(cells) != len(lines) * len(teams):
+                    raise ValueError(f"{csv_path} has rows without one value per team.")
+                cells[np.char.strip(cells) == ""] = "0"
+                try:
+                    cells = cells.astype(np.int64)
+                except ValueError:
+                    raise ValueError(f"{csv_path} has points that are not integers.") from None
+                rounds.append(parse_round_labels(pd.Series(labels)))
+                cells.tofile(f)
+        if not rounds:
+            return np.empty(0, dtype=np.int64), teams, np.empty((0, len(teams)), dtype=np.int64)
+        rounds = np.concatenate(rounds)
+        return rounds, teams, np.memmap(matrix_path, dtype=np.int64, mode="r",
+                                        shape=(len(rounds), len(teams)))
+
+
+def load_market(csv_path, cache_dir=None):
+    """
+    Loads a market CSV ('Mes' column plus one column per team). Empty and non
+    numeric cells (e.g. '-') count as 0, as in the original market report.
+
+    :param csv_path: str - Path to the CSV market data file.
+    :param cache_dir: str - Folder for the binary snapshots. If None, the CSV is always parsed.
+    :return: tuple - (months, teams, moves), with the months as datetime64[M], the team
+        names and the month x team matrix of market moves, in the file order.
+    """
+    return _load(csv_path, cache_dir, "market", MARKET_LABEL_COLUMN, parse_month_labels,
+                 lenient=True)
+
+
+def to_count_matrix(frame):
+    """
+    Converts a table of counts to an integer matrix, all the cells at once.
+    Empty and non numeric cells count as 0.
+
+    :param frame: pd.DataFrame - Team columns.
+    :return: np.ndarray - int64 matrix with the same shape.
+    """
+    values = pd.to_numeric(pd.Series(frame.to_numpy().ravel()), errors="coerce")
+    return values.fillna(0).to_numpy().astype(np.int64).reshape(frame.shape)
+
+
+def read_header(csv_path, label_column):
+    """
+    Reads and validates the header of a league CSV.
+
+    :param csv_path: str - Path to the CSV file.
+    :param label_column: str - Expected name of the first column.
+    :return: pd.Index - Column names: the label column and the teams.
+    """
+    header = pd.read_csv(csv_path, delimiter=";", encoding="utf-8", nrows=0).columns
+    if len(header) < 2 or header[0] != label_column:
+        raise ValueError(
+            f"{csv_path} must have a '{label_column}' first column followed by one column per team."
+        )
+    if header.duplicated().any():
+        raise ValueError(f"{csv_path} has duplicated teams: {header[header.duplicated()].tolist()}")
+    return header
+
+
+def read_typed_csv(csv_path, label_column, lenient=False):
+    """
+    Reads a league CSV with explicit dtypes, after validating its header.
+
+    :param csv_path: str - Path to the CSV file.
+    :param label_column: str - Expected name of the first column.
+    :param lenient: bool - If True, team columns are read as strings, to be
+        coerced later (see to_count_matrix), instead of failing on a non numeric cell.
+    :return: pd.DataFrame - Label column as strings, team columns as nullable integers
+        (or strings, if lenient).
+    """
+    header = read_header(csv_path, label_column)
+    dtype = {column: str if lenient else "Int64" for column in header[1:]}
+    dtype[label_column] = str
+    return pd.read_csv(csv_path, delimiter=";", encoding="utf-8", dtype=dtype, engine=CSV_ENGINE)
+
+
+def _load(csv_path, cache_dir, kind, label_column, parse_labels, lenient=False):
+    with profiler.stage(f"csv.{kind}"):
+        snapshot_path = None
+        if cache_dir is not None:
+            path_hash = hashlib.sha1(os.path.abspath(csv_path).encode("utf-8")).hexdigest()[:16]
+            snapshot_path = os.path.join(cache_dir, f"{kind}-{path_hash}.npz")
+            snapshot = _read_snapshot(snapshot_path, csv_path)
+            if snapshot is not None:
+                return snapshot
+
+        df = read_typed_csv(csv_path, label_column, lenient=lenient)
+        labels = parse_labels(df[label_column])
+        teams = list(df.columns[1:])
+        if lenient:
+            matrix = to_count_matrix(df[teams])
+        else:
+            matrix = df[teams].fillna(0).to_numpy(dtype=np.int64)
+
+        if snapshot_path is not None:
+            _write_snapshot(snapshot_path, csv_path, labels, teams, matrix)
+        return labels, teams, matrix
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_snapshot(snapshot_path, csv_path):
+    # The snapshot is valid if the CSV has the same mtime and size (cheap
+    # check) or, failing that, the same content hash
+    if not os.path.exists(snapshot_path):
+        return None
+    stat = os.stat(csv_path)
+    try:
+        with np.load(snapshot_path, allow_pickle=False) as snapshot:
+            data = {name: snapshot[name] for name in SNAPSHOT_FIELDS}
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        # Unreadable (e.g. truncated) snapshot, parsed again and rewritten
+        return None
+    same_stat = int(data["mtime_ns"]) == stat.st_mtime_ns and int(data["size"]) == stat.st_size
+    if not same_stat:
+        if str(data["sha256"]) != file_sha256(csv_path):
+            return None
+        # Same content, just touched: refresh the stat so the next run skips the hash
+        _write_snapshot(snapshot_path, csv_path, data["labels"], data["teams"].tolist(),
+                        data["matrix"], sha256=str(data["sha256"]))
+    return data["labels"], data["teams"].tolist(), data["matrix"]
+
+
+def _write_snapshot(snapshot_path, csv_path, labels, teams, matrix, sha256=None):
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    stat = os.stat(csv_path)
+    tmp_path = f"{snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            labels=labels,
+            teams=np.asarray(teams, dtype=str),
+            matrix=matrix,
+            mtime_ns=np.int64(stat.st_mtime_ns),
+            size=np.int64(stat.st_size),
+            sha256=np.asarray(sha256 or file_sha256(csv_path))
+        )
+    os.replace(tmp_path, snapshot_path)
@@ -1,16 +1,231 @@
+import io
 import os
+import json
+import time
+import hashlib
+import inspect
+import threading
+import functools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
-import matplotlib.pyplot as plt
+from instrumentation import profiler
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, the cache is only locked per process there
+    fcntl = None
+
+# Bump it when the look of the plots changes, to invalidate cached images
+CHART_CACHE_VERSION = 1
+
+# One lock per cache folder, shared by every ChartCache of this process
+_CACHE_LOCKS = {}
+_CACHE_LOCKS_LOCK = threading.Lock()
+
+# Visual translation of column names
+VISUAL_NAMES = {
+    'position': 'Posición',
+    'aggregated_points': 'Puntos',
+    'rolling_mean': 'Media de puntos (últimas jornadas)',
+    'gap_to_leader': 'Distancia al líder',
+}
+
+
+class ChartCache:
+    """
+    Content-addressed cache of rendered plots. Images are stored under a hash
+    of the plot name and all its arguments (data included), and a manifest
+    keeps track of them so the least recently used ones are evicted when the
+    cache grows over max_bytes. Several threads and processes may share the
+    same cache: the manifest is only rewritten by put(), under a lock.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = 50 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self.lock_path = os.path.join(cache_dir, 'manifest.lock')
+        with _CACHE_LOCKS_LOCK:
+            self.__lock = _CACHE_LOCKS.setdefault(os.path.realpath(cache_dir), threading.Lock())
+
+    @staticmethod
+    def key(plot: str, arguments: dict) -> str:
+        """
+        Hashes a plot name and its arguments. DataFrames are hashed by their
+        content, the rest of arguments by their JSON representation.
+        """
+        digest = hashlib.sha256(f'{CHART_CACHE_VERSION}:{plot}'.encode('utf-8'))
+        for name in sorted(arguments):
+            value = arguments[name]
+            digest.update(name.encode('utf-8'))
+            if isinstance(value, pd.DataFrame):
+                digest.update(json.dumps(list(map(str, value.columns))).encode('utf-8'))
+                digest.update(pd.util.hash_pandas_object(value, index=False).values.tobytes())
+            else:
+                digest.update(json.dumps(value, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns:
+            tuple: The (file name, PNG bytes) cached under key, or None if it is not cached.
+        """
+        entry = self.__read_manifest().get(key)
+        if entry is None:
+            return None
+        cached_path = os.path.join(self.cache_dir, f'{key}.png')
+        try:
+            with open(cached_path, 'rb') as f:
+                data = f.read()
+            # The image modification time tracks its last use, without rewriting the manifest
+            os.utime(cached_path)
+        except FileNotFoundError:
+            # Evicted by another writer
+            return None
+        return entry['file_name'], data
+
+    def put(self, key: str, file_name: str, data: bytes):
+        """
+        Adds a rendered image to the cache, evicting the least recently used
+        images if the cache gets bigger than max_bytes.
+        """
+        with self.__locked():
+            cached_path = os.path.join(self.cache_dir, f'{key}.png')
+            self.__write_atomic(cached_path, data)
+            manifest = self.__read_manifest()
+            manifest[key] = {'file_name': file_name, 'size': len(data)}
+            # Images left out of the manifest (e.g. by an older, unlocked version) can
+            # never be served, so they are removed instead of growing the cache forever
+            for png_name in os.listdir(self.cache_dir):
+                if png_name.endswith('.png') and png_name[:-len('.png')] not in manifest:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(os.path.join(self.cache_dir, png_name))
+
+            def last_used(old_key):
+                try:
+                    return os.path.getmtime(os.path.join(self.cache_dir, f'{old_key}.png'))
+                except FileNotFoundError:
+                    return 0.0
+
+            total_size = sum(entry['size'] for entry in manifest.values())
+            for old_key in sorted(manifest, key=last_used):
+                if total_size <= self.max_bytes:
+                    break
+                if old_key == key:
+                    continue
+                total_size -= manifest.pop(old_key)['size']
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(self.cache_dir, f'{old_key}.png'))
+            self.__write_atomic(self.manifest_path, json.dumps(manifest).encode('utf-8'))
+
+    def __read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @contextlib.contextmanager
+    def __locked(self):
+        # Threads of this process first, then other processes through a file lock
+        with self.__lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def __write_atomic(path, data):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+def _cached_plot(plot_method):
+    """
+    Makes a Graficator plot method reuse the cached image when it was already
+    rendered with the same data and parameters.
+    """
+    signature = inspect.signature(plot_method)
+
+    @functools.wraps(plot_method)
+    def wrapper(self, *args, **kwargs):
+        with profiler.stage(f'chart.{plot_method.__name__}'):
+            if self.cache is None:
+                return plot_method(self, *args, **kwargs)
+            key = self.cache_key(plot_method.__name__, *args, **kwargs)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return self._output(*cached)
+            image = plot_method(self, *args, **kwargs)
+            self.cache.put(key, *self._image_file_name_and_bytes(image))
+            return image
+
+    wrapper.signature = signature
+    return wrapper
+
 
 class Graficator:
     """
     A class to generate various plots from league statistics data.
+    Every plot is drawn on its own Figure with an Agg canvas, without the
+    global pyplot state, so several plots can be rendered at the same time.
     """
-    def plot_lines(self, df: pd.DataFrame, value_column: str = None, reverse_y_axis=False, 
-                   round_numbers_to_exclude=None) -> None:
+    def __init__(self, output_dir: str = None, use_cache: bool = True,
+                 cache_max_bytes: int = 50 * 1024 * 1024, save_to_disk: bool = True):
+        """
+        Args:
+            output_dir (str, optional): Folder where the images are saved.
+                Defaults to the 'generated_files' folder under BASE_DIR.
+            save_to_disk (bool, optional): If True, plots are saved as PNG files and their
+                paths are returned. If False, plots are returned as in-memory PNG buffers
+                (io.BytesIO, named after the file they would have been saved to).
+            use_cache (bool, optional): If True, plots whose data and parameters did not
+                change are copied from the cache in '<output_dir>/chart_cache' instead of
+                being rendered again.
+            cache_max_bytes (int, optional): Maximum size of the cache.
+        """
+        if output_dir is None:
+            output_dir = os.path.join(
+                os.getenv('BASE_DIR'),
+                'generated_files'
+            )
+        self.output_dir = output_dir
+        self.save_to_disk = save_to_disk
+        self.cache = None
+        if use_cache:
+            self.cache = ChartCache(os.path.join(output_dir, 'chart_cache'), cache_max_bytes)
+
+    def cache_key(self, plot: str, *args, **kwargs) -> str:
+        """
+        Returns the cache key of calling the plot method with the given arguments.
+        """
+        bound = getattr(Graficator, plot).signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        arguments.pop('self')
+        return ChartCache.key(plot, arguments)
+
+    @_cached_plot
+    def plot_lines(self, df: pd.DataFrame, value_column: str = None, reverse_y_axis=False,
+                   round_numbers_to_exclude=None, figsize=(14, 6), max_players: int = 30):
         """
         Generates a line plot where the x-axis represents the rounds, the y-axis is the value,
         and each player is represented as a separate colored line in the plot.
+        With more than max_players players it falls back to plot_bands, drawing
+        the first and last players plus the percentile bands of all of them.
         The plot is saved as an image in the 'generated_files' folder.
 
         Args:
@@ -19,6 +234,11 @@ class Graficator:
                 If None, it is inferred as the column that is not 'round' or 'player'.
             reverse_y_axis (bool, optional): If True, the y-axis will be reversed (descending order).
             round_numbers_to_exclude (list, optional): List of round numbers to exclude from the plot.
+            figsize (tuple, optional): Figure size in inches.
+            max_players (int, optional): Maximum number of players drawn as lines.
+
+        Returns:
+            str | io.BytesIO: Path to the saved plot image, or the in-memory image.
         """
         if value_column is None:
             value_column = next(
@@ -28,91 +248,302 @@ class Graficator:
         if round_numbers_to_exclude is not None:
             df = df[~df['round'].isin(round_numbers_to_exclude)]
 
+        if df['player'].nunique() > max_players:
+            from stats_calculator import DEFAULT_PERCENTILES, summarize_bands
+
+            wide = df.pivot(index='round', columns='player', values=value_column)
+            # The best players of the last round first (lowest values if the axis is reversed)
+            last_values = wide.iloc[-1].to_numpy()
+            order = last_values.argsort(kind='stable')
+            if not reverse_y_axis:
+                order = order[::-1]
+            n_highlight = max(1, max_players // 6)
+            # Not order[-n_highlight:], it would take every player if n_highlight was 0
+            highlighted = list(order[:n_highlight]) + list(order[len(order) - n_highlight:])
+            # Every round has all the positions, so their percentiles say nothing
+            percentiles = () if value_column == 'position' else DEFAULT_PERCENTILES
+            bands = summarize_bands(wide.index.to_numpy(), list(wide.columns), wide.to_numpy(),
+                                    highlighted, percentiles)
+            return self.__draw_bands(bands, value_column, reverse_y_axis, figsize)
+
         # Create a wide horizontal figure
-        plt.figure(figsize=(14, 6))
+        fig = Figure(figsize=figsize)
+        ax = fig.add_subplot()
         for player, group in df.groupby('player'):
-            plt.plot(group['round'], group[value_column], marker='o', label=player)
-        # Visual translation of column names
-        visual_names = {
-            'position': 'Posición',
-            'aggregated_points': 'Puntos',
-        }
-        y_label = visual_names.get(value_column, value_column)
-        title_value = visual_names.get(value_column, value_column)
-        plt.xlabel('Jornada')
-        plt.ylabel(y_label)
-        plt.title(f'{title_value} por Jornada y Equipo')
+            ax.plot(group['round'], group[value_column], marker='o', label=player)
+        y_label = VISUAL_NAMES.get(value_column, value_column)
+        title_value = VISUAL_NAMES.get(value_column, value_column)
+        ax.set_xlabel('Jornada')
+        ax.set_ylabel(y_label)
+        ax.set_title(f'{title_value} por Jornada y Equipo')
 
         # Show grid in the background
-        plt.grid(True, which='both', axis='both', linestyle='--', linewidth=0.7, alpha=0.7)
+        ax.grid(True, which='both', axis='both', linestyle='--', linewidth=0.7, alpha=0.7)
 
         # Legend below the plot, outside of it
-        plt.legend(title='Equipo', loc='upper center', bbox_to_anchor=(0.5, -0.18), ncol=4, frameon=False)
-        plt.tight_layout(rect=[0, 0.08, 1, 1])
+        ax.legend(title='Equipo', loc='upper center', bbox_to_anchor=(0.5, -0.18), ncol=4, frameon=False)
+        fig.tight_layout(rect=[0, 0.08, 1, 1])
 
         if reverse_y_axis:
-            plt.gca().invert_yaxis()
+            ax.invert_yaxis()
 
-        # Create the directory if it doesn't exist
-        output_dir = os.path.join(
-            os.getenv('BASE_DIR'),
-            'generated_files'
-        )
-        os.makedirs(output_dir, exist_ok=True)
         # Use the visual name also in the generated file
-        output_path = os.path.join(output_dir, f'{value_column}_per_round_and_team.png')
-        plt.savefig(output_path, bbox_inches='tight')
-        plt.close()
-        return output_path
+        return self.__save(fig, f'{value_column}_per_round_and_team.png')
 
-    def plot_market_moves_bar(self, moves_dict: dict) -> str:
+    @_cached_plot
+    def plot_bands(self, bands: dict, value_column: str, reverse_y_axis=False, figsize=(14, 6)):
+        """
+        Generates the line plot of a league with too many players to draw one
+        line each: shaded percentile bands of all the players in each round,
+        plus a line for each highlighted player. It is saved under the same
+        file name as plot_lines, so it can take its place.
+
+        Args:
+            bands (dict): 'rounds', 'percentiles' and highlighted 'teams', as returned by
+                stats_calculator.summarize_bands() or PointsStatsCalculator.get_band_data().
+            value_column (str): Name of the plotted value (e.g. 'position').
+            reverse_y_axis (bool, optional): If True, the y-axis will be reversed (descending order).
+            figsize (tuple, optional): Figure size in inches.
+
+        Returns:
+            str | io.BytesIO: Path to the saved plot image, or the in-memory image.
+        """
+        return self.__draw_bands(bands, value_column, reverse_y_axis, figsize)
+
+    def __draw_bands(self, bands, value_column, reverse_y_axis, figsize):
+        rounds = bands['rounds']
+        percentiles = sorted(bands['percentiles'], key=float)
+        fig = Figure(figsize=figsize)
+        ax = fig.add_subplot()
+
+        # Nested bands from the outer percentiles inwards, darker towards the median
+        n_bands = len(percentiles) // 2
+        for band in range(n_bands):
+            low, high = percentiles[band], percentiles[-band - 1]
+            ax.fill_between(rounds, bands['percentiles'][low], bands['percentiles'][high],
+                            color='tab:blue', alpha=0.15 + 0.15 * band, linewidth=0,
+                            label=f'Percentiles {low}-{high}')
+        if len(percentiles) % 2:
+            median = percentiles[n_bands]
+            ax.plot(rounds, bands['percentiles'][median], color='tab:blue', linestyle='--',
+                    label=f'Percentil {median}')
+        for player, values in bands['teams'].items():
+            ax.plot(rounds, values, marker='o', markersize=3, label=player)
+
+        y_label = VISUAL_NAMES.get(value_column, value_column)
+        ax.set_xlabel('Jornada')
+        ax.set_ylabel(y_label)
+        ax.set_title(f'{y_label} por Jornada: primeros y últimos equipos')
+        ax.grid(True, which='both', axis='both', linestyle='--', linewidth=0.7, alpha=0.7)
+        ax.legend(title='Equipo', loc='upper center', bbox_to_anchor=(0.5, -0.18), ncol=4, frameon=False)
+        fig.tight_layout(rect=[0, 0.08, 1, 1])
+        if reverse_y_axis:
+            ax.invert_yaxis()
+        return self.__save(fig, f'{value_column}_per_round_and_team.png')
+
+    @_cached_plot
+    def plot_market_moves_bar(self, moves_dict: dict, figsize=(12, 6)):
         """
         Generates a bar plot where the x-axis represents teams and the y-axis is the number of market moves.
         The plot is saved as an image in the 'generated_files' folder.
 
         Args:
             moves_dict (dict): Dictionary with team names as keys and number of moves as values.
+            figsize (tuple, optional): Figure size in inches.
 
         Returns:
-            str: Path to the saved plot image.
+            str | io.BytesIO: Path to the saved plot image, or the in-memory image.
         """
-        import matplotlib.cm as cm
-
         # Sort moves_dict by number of moves in descending order
         sorted_items = sorted(moves_dict.items(), key=lambda x: x[1], reverse=True)
         teams = [item[0] for item in sorted_items]
         moves = [item[1] for item in sorted_items]
 
-        # Normalize moves for colormap (higher moves = darker blue, lower = normal blue)
-        norm = plt.Normalize(vmin=min(moves), vmax=max(moves))
-        cmap = cm.get_cmap('Blues')
-
-        # Invert the normalized values so that higher moves are darker blue
-        colors = [cmap(norm(val)) for val in moves]
-
-        # To ensure higher moves are darker, reverse the colormap
+        # Higher moves = darker blue, lower = normal blue
+        cmap = matplotlib.colormaps['Blues']
         colors = [cmap(0.4 + 0.6 * (val - min(moves)) / (max(moves) - min(moves) if max(moves) != min(moves) else 1)) for val in moves]
 
-        plt.figure(figsize=(12, 6))
-        bars = plt.bar(teams, moves, color=colors)
-        plt.xlabel('Equipo')
-        plt.ylabel('Compras/Ventas')
-        plt.title('Movimientos de Mercado por Equipo')
-        plt.xticks(rotation=30, ha='right')
+        fig = Figure(figsize=figsize)
+        ax = fig.add_subplot()
+        bars = ax.bar(teams, moves, color=colors)
+        ax.set_xlabel('Equipo')
+        ax.set_ylabel('Compras/Ventas')
+        ax.set_title('Movimientos de Mercado por Equipo')
+        ax.tick_params(axis='x', labelrotation=30)
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment('right')
 
         # Annotate bars with values
         for bar, value in zip(bars, moves):
-            plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height(), str(value),
-                     ha='center', va='bottom', fontsize=10)
-
-        plt.tight_layout()
-
-        output_dir = os.path.join(
-            os.getenv('BASE_DIR'),
-            'generated_files'
-        )
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, 'market_moves_per_team.png')
-        plt.savefig(output_path, bbox_inches='tight')
-        plt.close()
+            ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height(), str(value),
+                    ha='center', va='bottom', fontsize=10)
+
+        fig.tight_layout()
+        return self.__save(fig, 'market_moves_per_team.png')
+
+    @_cached_plot
+    def plot_market_heatmap(self, heatmap: dict, figsize=(12, 8)):
+        """
+        Generates a heatmap of the market moves: one row per team, sorted by
+        total moves, and one column per month.
+
+        Args:
+            heatmap (dict): 'months' labels, 'teams' and their 'moves' per month, as
+                returned by MarketAnalytics.get_heatmap_data().
+            figsize (tuple, optional): Figure size in inches.
+
+        Returns:
+            str | io.BytesIO: Path to the saved plot image, or the in-memory image.
+        """
+        months = heatmap['months']
+        teams = heatmap['teams']
+        moves = heatmap['moves']
+
+        fig = Figure(figsize=figsize)
+        ax = fig.add_subplot()
+        image = ax.imshow(moves, cmap=matplotlib.colormaps['Blues'], aspect='auto')
+        ax.set_xticks(range(len(months)), months)
+        ax.set_yticks(range(len(teams)), teams)
+        ax.tick_params(axis='x', labelrotation=30)
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment('right')
+        ax.set_xlabel('Mes')
+        ax.set_ylabel('Equipo')
+        ax.set_title('Movimientos de Mercado por Mes y Equipo')
+        fig.colorbar(image, ax=ax, label='Compras/Ventas')
+
+        # Annotate the cells with the moves, when they still fit
+        if len(teams) * len(months) <= 400:
+            max_moves = max((max(team_moves) for team_moves in moves), default=0)
+            for row, team_moves in enumerate(moves):
+                for column, value in enumerate(team_moves):
+                    ax.text(column, row, str(value), ha='center', va='center', fontsize=8,
+                            color='white' if value > max_moves / 2 else 'black')
+
+        fig.tight_layout()
+        return self.__save(fig, 'market_moves_per_month_and_team.png')
+
+    @_cached_plot
+    def plot_projected_standings(self, projection: dict, figsize=(12, 8)):
+        """
+        Generates a heatmap of the projected final standings: one row per team,
+        sorted by expected position, and one column per final position, colored
+        by the probability of the team ending there.
+
+        Args:
+            projection (dict): 'teams' and their 'position_probabilities', as returned
+                by StandingsProjection.get_projection_dict().
+            figsize (tuple, optional): Figure size in inches.
+
+        Returns:
+            str | io.BytesIO: Path to the saved plot image, or the in-memory image.
+        """
+        teams = projection['teams']
+        probabilities = projection['position_probabilities']
+        n_positions = len(probabilities[0]) if probabilities else 0
+
+        fig = Figure(figsize=figsize)
+        ax = fig.add_subplot()
+        heatmap = ax.imshow(probabilities, cmap=matplotlib.colormaps['Blues'], vmin=0, vmax=1,
+                            aspect='auto')
+        ax.set_xticks(range(n_positions), [str(position) for position in range(1, n_positions + 1)])
+        ax.set_yticks(range(len(teams)), teams)
+        ax.set_xlabel('Posición final')
+        ax.set_ylabel('Equipo')
+        ax.set_title('Proyección de la Clasificación Final')
+        fig.colorbar(heatmap, ax=ax, label='Probabilidad')
+
+        # Annotate the cells with the percentages, when they still fit
+        if len(teams) <= 20:
+            for row, team_probabilities in enumerate(probabilities):
+                for column, probability in enumerate(team_probabilities):
+                    if probability >= 0.005:
+                        ax.text(column, row, f'{probability:.0%}', ha='center', va='center',
+                                fontsize=8, color='white' if probability > 0.5 else 'black')
+
+        fig.tight_layout()
+        return self.__save(fig, 'projected_standings.png')
+
+    def render_all(self, specs: list, max_workers: int = None, use_processes: bool = True) -> list:
+        """
+        Renders several plots in parallel. Cached plots are restored here and
+        only the rest are sent to the workers.
+
+        Args:
+            specs (list): One dict per plot, with the 'plot' key naming the Graficator
+                method (e.g. 'plot_lines') and the 'kwargs' key with its arguments.
+            max_workers (int, optional): Number of workers (default: number of CPUs).
+            use_processes (bool, optional): If True, plots are rendered in a process pool,
+                otherwise in a thread pool.
+
+        Returns:
+            list: One dict per spec, in the same order, with the 'plot' name, the 'image'
+                (path or in-memory buffer, see save_to_disk), the rendering time in 'seconds' and whether it came from the cache
+                ('cached').
+        """
+        results = [None] * len(specs)
+        keys = [None] * len(specs)
+        pending = []
+        for index, spec in enumerate(specs):
+            if self.cache is not None:
+                start = time.perf_counter()
+                keys[index] = self.cache_key(spec['plot'], **spec.get('kwargs', {}))
+                cached = self.cache.get(keys[index])
+                if cached is not None:
+                    results[index] = {'plot': spec['plot'], 'image': self._output(*cached),
+                                      'seconds': time.perf_counter() - start, 'cached': True}
+                    profiler.record(f"chart.{spec['plot']}", results[index]['seconds'], cached=True)
+                    continue
+            pending.append(index)
+        if pending:
+            executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+            with executor_class(max_workers=max_workers) as executor:
+                rendered = executor.map(_render_spec, [self.output_dir] * len(pending),
+                                        [self.save_to_disk] * len(pending),
+                                        [specs[index] for index in pending])
+                for index, result in zip(pending, rendered):
+                    results[index] = result
+                    # The worker's own records stay in its process
+                    profiler.record(f"chart.{result['plot']}", result['seconds'], cached=False)
+                    if self.cache is not None:
+                        self.cache.put(keys[index], *self._image_file_name_and_bytes(result['image']))
+        return results
+
+    def __save(self, fig, file_name):
+        # The PNG is encoded once, in memory, and only written if needed
+        FigureCanvasAgg(fig)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        return self._output(file_name, buffer.getvalue())
+
+    def _output(self, file_name, data):
+        """
+        Returns a rendered PNG the way this Graficator was configured to:
+        written to the output folder (its path) or as an in-memory buffer.
+        """
+        if not self.save_to_disk:
+            buffer = io.BytesIO(data)
+            buffer.name = file_name
+            return buffer
+        # Create the directory if it doesn't exist
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_path = os.path.join(self.output_dir, file_name)
+        with open(output_path, 'wb') as f:
+            f.write(data)
         return output_path
+
+    @staticmethod
+    def _image_file_name_and_bytes(image):
+        if isinstance(image, io.BytesIO):
+            return image.name, image.getvalue()
+        with open(image, 'rb') as f:
+            return os.path.basename(image), f.read()
+
+
+def _render_spec(output_dir, save_to_disk, spec):
+    # Runs in a worker: renders one plot spec and times it
+    start = time.perf_counter()
+    graficator = Graficator(output_dir=output_dir, use_cache=False, save_to_disk=save_to_disk)
+    image = getattr(graficator, spec['plot'])(**spec.get('kwargs', {}))
+    return {'plot': spec['plot'], 'image': image, 'seconds': time.perf_counter() - start,
+            'cached': False}
@@ -0,0 +1,149 @@
+import sys
+import json
+import time
+import functools
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def get_peak_rss_mb():
+    """
+    Peak resident set size of the current process, in MB (None if unknown).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RunProfiler:
+    """
+    Collects the duration and memory of the pipeline stages of a run.
+    Stages are recorded with the stage() context manager or the timed()
+    decorator, and can be dumped as a JSON run report. It is thread-safe,
+    but stages run in other processes have to be recorded by the parent
+    with record().
+    Each record has the peak RSS of the process so far ('peak_rss_mb', it only
+    grows) and, for stage(), how much the stage raised it ('peak_rss_growth_mb',
+    the part of the peak that belongs to the stage; nested stages count in
+    their parents too, and concurrent stages share it).
+    """
+    def __init__(self):
+        self.records = []
+        self.enabled = True
+        self.track_memory = False
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def reset(self, track_memory=False):
+        """
+        Drops the recorded stages and starts a new run.
+        :param track_memory: If True, the peak Python memory allocated in each
+            stage is also measured with tracemalloc (slower).
+        """
+        with self._lock:
+            self.records = []
+            self._start = time.perf_counter()
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name, **details):
+        """
+        Records the duration of the code inside the with block.
+        :param name: Stage name, dotted by component (e.g. 'pdf.text_slide').
+        :param details: Extra JSON-serializable values stored with the record.
+        """
+        if not self.enabled:
+            yield
+            return
+        if self.track_memory:
+            tracemalloc.reset_peak()
+        peak_rss_before = get_peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak_traced_mb = None
+            if self.track_memory:
+                peak_traced_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            peak_rss_growth_mb = None
+            if peak_rss_before is not None:
+                peak_rss_growth_mb = get_peak_rss_mb() - peak_rss_before
+            self.record(name, seconds, peak_traced_mb=peak_traced_mb,
+                        peak_rss_growth_mb=peak_rss_growth_mb, **details)
+
+    def timed(self, name):
+        """
+        Decorator version of stage().
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds, **details):
+        """
+        Adds a stage that was timed elsewhere (e.g. in a worker process).
+        """
+        if not self.enabled:
+            return
+        record = {
+            "stage": name,
+            "seconds": seconds,
+            "peak_rss_mb": get_peak_rss_mb(),
+            "thread": threading.current_thread().name,
+        }
+        record.update({key: value for key, value in details.items() if value is not None})
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self):
+        """
+        Aggregates the records by stage name.
+        :return: dict - For each stage: number of calls, total and max seconds.
+        """
+        stages = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            stage = stages.setdefault(record["stage"], {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stage["calls"] += 1
+            stage["total_seconds"] += record["seconds"]
+            stage["max_seconds"] = max(stage["max_seconds"], record["seconds"])
+        return stages
+
+    def report(self):
+        with self._lock:
+            records = list(self.records)
+        return {
+            "wall_seconds": time.perf_counter() - self._start,
+            "peak_rss_mb": get_peak_rss_mb(),
+            "summary": self.summary(),
+            "stages": records,
+        }
+
+    def write_report(self, path):
+        """
+        Writes the run report as JSON.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+
+# Profiler shared by the whole pipeline
+profiler = RunProfiler()
@@ -1,133 +1,659 @@
 import os
-import pandas as pd
-from dotenv import load_dotenv
-from stats_calculator import PointsStatsCalculator
-from graficator import Graficator
-from pdf_converter import PDFPresentation
-from ai_data_assistant import OpenAIDataAssistant
+import sys
+import time
+import argparse
+import importlib
+import threading
+import contextlib
 
-if __name__ == "__main__":
-    # Cargar variables de entorno desde .env
-    load_dotenv()
-    # BASE_DIR env variable should point to the 
-    # project root directory:
-    base_dir = os.getenv("BASE_DIR")
-    # Check if we have to include market data:
-    include_market_data = str(os.getenv('INCLUDE_MARKET_DATA')).lower() == "true"
-    # Path to the CSV points per round file
-    csv_points_path = os.path.join(
-        base_dir,
-        "dataset",
-        "points.csv"
-    )
-    # Read points data using DataReader
-    df = pd.read_csv(csv_points_path, delimiter=';', encoding='utf-8')
+# Heavy modules are imported inside the stages that need them, so quick
+# commands (e.g. 'stats') do not pay for matplotlib, reportlab or openai.
+STAGE_MODULES = {
+    "stats": ["numpy", "pandas", "data_loader", "market_analytics", "stats_calculator"],
+    "charts": ["numpy", "pandas", "data_loader", "market_analytics", "stats_calculator",
+               "analytics", "projection", "matplotlib", "graficator"],
+    "report": ["numpy", "pandas", "data_loader", "market_analytics", "stats_calculator",
+               "analytics", "projection", "pipeline", "matplotlib", "graficator", "reportlab",
+               "slides", "pdf_converter", "ai_data_assistant"],
+    "archive": ["numpy", "pandas", "data_loader", "market_analytics", "stats_calculator",
+                "season_archive"],
+    "records": ["numpy", "pandas", "data_loader", "market_analytics", "stats_calculator",
+                "season_archive"],
+}
+
+
+# Leagues with more teams run in big league mode: memory-mapped matrices
+# computed in chunks, band charts instead of one line per team, and no
+# teams x teams stats (head to head, projection)
+BIG_LEAGUE_TEAMS = 200
+
+
+def is_big_league(calculator):
+    return len(calculator.teams) > BIG_LEAGUE_TEAMS
+
+
+def profile_imports(module_names):
+    """
+    Imports the given modules one by one, timing each of them. Modules that
+    were already imported (e.g. as a dependency of a previous one) take ~0s.
+
+    :param module_names: list - Module names, in import order.
+    :return: list - (module name, seconds) tuples.
+    """
+    timings = []
+    for module_name in module_names:
+        start = time.perf_counter()
+        importlib.import_module(module_name)
+        timings.append((module_name, time.perf_counter() - start))
+    return timings
+
+
+def compute_stats(points_csv_path, output_dir):
+    """
+    Loads the points data and builds the PointsStatsCalculator, continuing
+    from the last run state when only new rounds were added. Big leagues are
+    computed in chunks, into memory-mapped files, instead.
+
+    :param points_csv_path: str - Path to the CSV points per round file.
+    :param output_dir: str - Folder where the generated files are written.
+    :return: PointsStatsCalculator
+    """
+    from data_loader import POINTS_LABEL_COLUMN, load_points, load_points_chunked, read_header
+    from stats_calculator import PointsStatsCalculator
+
+    if len(read_header(points_csv_path, POINTS_LABEL_COLUMN)) - 1 > BIG_LEAGUE_TEAMS:
+        # Parsed in chunks into a temporary file, which the calculator copies
+        # (sorted) into its own memory-mapped matrices
+        memmap_dir = os.path.join(output_dir, "big_league")
+        os.makedirs(memmap_dir, exist_ok=True)
+        matrix_path = os.path.join(memmap_dir, f"points.{os.getpid()}.{threading.get_ident()}.bin")
+        try:
+            return PointsStatsCalculator.from_matrix(
+                *load_points_chunked(points_csv_path, matrix_path), memmap_dir=memmap_dir
+            )
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(matrix_path)
+
+    # Read points data (parsed CSVs are kept as binary snapshots)
+    points_data = load_points(points_csv_path, cache_dir=os.path.join(output_dir, "snapshots"))
+    state_path = os.path.join(output_dir, "points_stats_state.npz")
+    calculator = PointsStatsCalculator.from_state(points_data, state_path=state_path)
+    calculator.save_state(state_path)
+    return calculator
+
+
+def archive_season(points_csv_path, output_dir, archive_path, league, season, finished=False):
+    """
+    Stores the season of a league in the all-time archive (see season_archive).
+
+    :param finished: bool - Whether the season is over (only then its leader
+        counts as a title).
+    :return: bool - True if the archive changed.
+    """
+    from season_archive import SeasonArchive
+
+    calculator = compute_stats(points_csv_path, output_dir)
+    with SeasonArchive(archive_path) as archive:
+        return calculator.archive_season(archive, league, season, finished=finished)
+
+
+def compute_market_data(market_csv_path, output_dir):
+    from data_loader import load_market
+
+    return load_market(market_csv_path, cache_dir=os.path.join(output_dir, "snapshots"))
+
+
+def compute_market_analytics(market_data, calculator):
+    from market_analytics import MarketAnalytics
 
-    # Instantiate the PointsStatsCalculator
-    calculator = PointsStatsCalculator(df)
+    return MarketAnalytics(market_data, calculator)
 
-    # Display the best and worst rounds overall:
+
+def compute_form_analytics(calculator):
+    from analytics import FormAnalytics
+
+    big_league = is_big_league(calculator)
+    return FormAnalytics(calculator, with_head_to_head=not big_league, keep_metrics=not big_league)
+
+
+def compute_projection(calculator, total_rounds):
+    """
+    Simulates the rest of the season. The seed is fixed, so the same data
+    always gives the same projection (and the cached chart is reused).
+    Big leagues have no projection (it is a teams x teams matrix).
+
+    :return: StandingsProjection or None
+    """
+    from projection import StandingsProjection
+
+    if is_big_league(calculator):
+        return None
+    projection = StandingsProjection(calculator, total_rounds=total_rounds)
+    projection.simulate(n_simulations=20000, seed=0)
+    return projection
+
+
+def get_text_rounds(calculator):
+    """
+    :return: list - Texts with the best and worst rounds overall and of each
+        player (in big leagues, only of the first and last ones).
+    """
     text_rounds_list = []
     text_rounds_list.append(
         calculator.get_verbose_best_worst_round(is_overall=True)
     )
-
-    # Display the best and worst rounds for each player:
-    for player in df.columns[1:]:  # Skip the first column which is 'Jornada'
+    extremes_index = calculator.get_best_worst_rounds_index()
+    players = calculator.teams
+    if is_big_league(calculator):
+        players = [calculator.teams[team_index]
+                   for team_index in calculator.get_highlighted_teams().tolist()]
+    for player in players:
+        player_extremes = extremes_index["teams"][player]
         text_rounds_list.append(
-            calculator.get_verbose_best_worst_round(player)
+            calculator.get_verbose_best_worst_round(
+                best=player_extremes["best"], worst=player_extremes["worst"]
+            )
         )
+    return text_rounds_list
 
-    # Graphics:
-    graficator = Graficator()
-    generated_file_paths = []
-
-    df_positions = calculator.get_position_data()
-    position_image_path = graficator.plot_lines(df_positions, value_column="position", 
-                          reverse_y_axis=True)
-    generated_file_paths.append(position_image_path)
-    
-    df_points = calculator.get_points_data()
-    points_image_path = graficator.plot_lines(df_points, value_column="aggregated_points", 
-                          round_numbers_to_exclude=[6])
-    generated_file_paths.append(points_image_path)
-
-    # Market data:
-    if include_market_data:
-        # Path to the CSV market data file
-        csv_market_path = os.path.join(
-            base_dir,
-            "dataset",
-            "market.csv"
-        )
-        # Read the data:
-        df_market = pd.read_csv(csv_market_path, delimiter=';', encoding='utf-8')
-        market_data_dict = calculator.get_market_movements_dict(df_market)
 
-    # AI Questions:
-    ai_questions_list = [
-        {
+def get_chart_spec(chart, source):
+    """
+    Returns the Graficator spec of one of the report charts.
+
+    :param chart: str - 'position' or 'points' (source is the calculator), 'form'
+        (FormAnalytics), 'projection' (StandingsProjection) or 'market' (market data,
+        see data_loader.load_market).
+    :return: dict - 'plot' method name and its 'kwargs'.
+    """
+    if chart == "market":
+        from market_analytics import MarketAnalytics
+
+        return {"plot": "plot_market_heatmap",
+                "kwargs": {"heatmap": MarketAnalytics(source).get_heatmap_data()}}
+    if chart == "projection":
+        return {"plot": "plot_projected_standings",
+                "kwargs": {"projection": source.get_projection_dict()}}
+    calculator = source.calculator if chart == "form" else source
+    if is_big_league(calculator):
+        # Summaries of the matrices, without building the long format data
+        bands = {
+            "position": lambda: calculator.get_band_data("position", percentiles=()),
+            "points": lambda: calculator.get_band_data("aggregated_points"),
+            "form": lambda: source.get_metric_band_data("rolling_mean"),
+        }[chart]()
+        value_column = {"position": "position", "points": "aggregated_points",
+                        "form": "rolling_mean"}[chart]
+        return {"plot": "plot_bands",
+                "kwargs": {"bands": bands, "value_column": value_column,
+                           "reverse_y_axis": chart == "position"}}
+    if chart == "position":
+        return {"plot": "plot_lines",
+                "kwargs": {"df": calculator.get_position_data(), "value_column": "position",
+                           "reverse_y_axis": True}}
+    if chart == "points":
+        return {"plot": "plot_lines",
+                "kwargs": {"df": calculator.get_points_data(), "value_column": "aggregated_points",
+                           "round_numbers_to_exclude": [6]}}
+    return {"plot": "plot_lines",
+            "kwargs": {"df": source.get_metric_data("rolling_mean"), "value_column": "rolling_mean"}}
+
+
+def render_charts(calculator, output_dir, market_data=None, save_chart_images=True,
+                  form_analytics=None, projection=None):
+    """
+    Renders the report charts in parallel.
+
+    :param form_analytics: FormAnalytics - Form metrics of the calculator. If None, they are computed.
+    :param projection: StandingsProjection - Simulated final standings. If None, there is no projection chart.
+    :return: list - The images (paths or in-memory buffers) of the position
+        chart, the points chart, the rolling mean chart, the projection chart (if
+        projection is given) and the market chart (if market_data is given).
+    """
+    from graficator import Graficator
+
+    if form_analytics is None:
+        form_analytics = compute_form_analytics(calculator)
+    chart_specs = [get_chart_spec("position", calculator), get_chart_spec("points", calculator),
+                   get_chart_spec("form", form_analytics)]
+    if projection is not None:
+        chart_specs.append(get_chart_spec("projection", projection))
+    if market_data is not None:
+        chart_specs.append(get_chart_spec("market", market_data))
+    graficator = Graficator(output_dir=output_dir, save_to_disk=save_chart_images)
+    return [chart_result["image"] for chart_result in graficator.render_all(chart_specs)]
+
+
+# Files the report charts are saved to (see Graficator), when they are saved to disk
+CHART_IMAGE_FILES = {
+    "position": "position_per_round_and_team.png",
+    "points": "aggregated_points_per_round_and_team.png",
+    "form": "rolling_mean_per_round_and_team.png",
+    "projection": "projected_standings.png",
+    "market": "market_moves_per_month_and_team.png",
+}
+
+
+def render_chart(source, chart, output_dir, save_chart_images):
+    """
+    Renders one of the report charts (see get_chart_spec).
+
+    :return: tuple - (file name, PNG bytes), or None if there is no source.
+    """
+    from graficator import Graficator
+
+    if source is None:
+        return None
+    spec = get_chart_spec(chart, source)
+    graficator = Graficator(output_dir=output_dir, save_to_disk=save_chart_images)
+    image = getattr(graficator, spec["plot"])(**spec["kwargs"])
+    return Graficator._image_file_name_and_bytes(image)
+
+
+# The per-team lists of the prompts are trimmed to fit in the token budget (see stats_calculator.dumps_in_budget)
+OMITTED_TEAMS_DESCRIPTION = (
+    " (si no caben todos los equipos, solo los primeros y los últimos, y 'omitted_teams' "
+    "es el número de equipos omitidos)"
+)
+
+AI_DATA_DESCRIPTION = (
+    "Datos en JSON: 'round_points' tiene una fila por jornada ('rounds') y una columna "
+    "por equipo ('teams'); 'standings' es la clasificación actual, con la variación de "
+    "posiciones y la media de puntos en esas jornadas" + OMITTED_TEAMS_DESCRIPTION
+)
+
+
+def get_ai_question(kind, *sources):
+    """
+    Builds one of the report questions to the AI. Each one only carries the
+    slice of data it needs, in a compact columnar form.
+
+    :param kind: str - 'highlights' or 'curiosity' (sources: the calculator),
+        'trends' (FormAnalytics), 'prediction' (the calculator and the
+        StandingsProjection, which may be None) or 'market' (MarketAnalytics).
+    :return: dict - 'readable_question', 'ai_question' and 'data'.
+    """
+    from stats_calculator import dumps_in_budget
+
+    if kind == "highlights":
+        return {
             "readable_question": "Lo más destacado",
-            "ai_question": "¿Qué es lo más destacado de los datos hasta ahora?",
-            "data": calculator.get_data_dict()
-        },
-        {
+            "ai_question": f"¿Qué es lo más destacado de los datos hasta ahora? {AI_DATA_DESCRIPTION}",
+            "data": sources[0].get_prompt_data(max_tokens=3000)
+        }
+    if kind == "curiosity":
+        return {
             "readable_question": "Una curiosidad",
-            "ai_question": "¿Qué curiosidad o dato curioso y rebuscado ves en los datos?",
-            "data": calculator.get_data_dict()
-        },
-        {
+            "ai_question": f"¿Qué curiosidad o dato curioso y rebuscado ves en los datos? {AI_DATA_DESCRIPTION}",
+            "data": sources[0].get_prompt_data(max_tokens=3000)
+        }
+    if kind == "trends":
+        return {
             "readable_question": "Tendencias",
-            "ai_question": "¿Quién tiene una mejor y peor tendencia fijándose solamente en las últimas jornadas?",
-            "data": calculator.get_data_dict()
-        },
-        {
+            "ai_question": (
+                "¿Quién tiene una mejor y peor tendencia fijándose solamente en las últimas jornadas? "
+                "Datos en JSON, una lista por métrica con los equipos en el orden de la clasificación "
+                "('team'): media y desviación típica de los puntos en las últimas 'window' jornadas, "
+                "racha de jornadas por encima (positiva) o por debajo (negativa) de la media, "
+                "posiciones ganadas en esas jornadas y distancia en puntos al líder"
+                + OMITTED_TEAMS_DESCRIPTION
+            ),
+            "data": dumps_in_budget(sources[0].get_summary(), max_tokens=3000)
+        }
+    if kind == "prediction":
+        calculator, projection = sources
+        if projection is None:
+            # Big leagues have no projection, the AI guesses from the last rounds
+            return {
+                "readable_question": "Una predicción",
+                "ai_question": f"¿Qué predicción harías sobre las siguientes jornadas? Responde lo más destacado en tres o cuatro frases. {AI_DATA_DESCRIPTION}",
+                "data": calculator.get_prompt_data(max_tokens=1500, last_n_rounds=5)
+            }
+        return {
             "readable_question": "Una predicción",
-            "ai_question": "¿Qué predicción harías sobre las siguientes jornadas? Responde lo más destacado en tres o cuatro frases.",
-            "data": calculator.get_data_dict()
+            "ai_question": (
+                "¿Qué predicción harías sobre el final de la liga? Responde lo más destacado en tres o "
+                "cuatro frases. Datos en JSON de una simulación de las jornadas que quedan, una lista "
+                "por métrica con los equipos en el orden de la clasificación final esperada ('team'): "
+                "posición actual, posición final esperada y probabilidad de ganar la liga, de acabar "
+                "entre los 'top_n' primeros y de acabar último" + OMITTED_TEAMS_DESCRIPTION
+            ),
+            "data": dumps_in_budget(projection.get_summary(), max_tokens=3000)
         }
+    return {
+        "readable_question": "El mercado",
+        "ai_question": (
+            "Dime un dato curioso y relevante sobre el número de operaciones en el mercado de fichajes "
+            "por cada equipo. Datos en JSON: operaciones de toda la liga en cada mes ('months', "
+            "'monthly_activity') y, por equipo ('team', de más a menos operaciones), operaciones, "
+            "parte del total y correlación de sus operaciones de cada mes con los puntos conseguidos "
+            "y las posiciones ganadas ese mes"
+        ),
+        "data": sources[0].get_summary(max_teams=50)
+    }
+
+
+def ask_ai_question(ai_data_assistant, *sources, kind):
+    question = get_ai_question(kind, *sources)
+    answer = ai_data_assistant.ask_insight(question["ai_question"], data=question["data"])
+    return f'{question["readable_question"]}\nIA: "{answer}"'
+
+
+def create_ai_data_assistant(open_ai_api_token, output_dir, open_ai_model, ai_client=None):
+    from ai_data_assistant import OpenAIDataAssistant
+
+    return OpenAIDataAssistant(
+        api_token=open_ai_api_token,
+        open_ai_model=open_ai_model,
+        client=ai_client,
+        cache_dir=os.path.join(output_dir, "ai_cache")
+    )
+
+
+def export_report(slides, report_formats, output_dir):
+    """
+    Renders the slides in every report format at the same time (see slides.export_slides).
+
+    :param report_formats: list - Formats to render ('pdf', 'html' or 'png').
+    :return: dict - Path of each rendered format.
+    """
+    from slides import REPORT_FORMATS, export_slides
+
+    paths = {report_format: os.path.join(output_dir, REPORT_FORMATS[report_format])
+             for report_format in report_formats}
+    return export_slides(slides, paths)
+
+
+def export_stats_json(calculator, json_format, json_file_path):
+    return calculator.export_json(json_file_path, json_format=json_format)
+
+
+def build_report_pipeline(points_csv_path, output_dir, market_csv_path=None,
+                          open_ai_api_token=None, save_chart_images=False,
+                          export_json_format=None, total_rounds=38,
+                          open_ai_model="gpt-3.5-turbo", ai_client=None, extra_report_formats=()):
+    """
+    Models the report as a DAG of stages (see pipeline.Pipeline):
+
+        points.csv -> calculator -> text_rounds, chart.position, chart.points, export_json
+        calculator -> form_analytics -> chart.form
+        calculator -> projection -> chart.projection
+        market.csv -> market_data -> chart.market
+        market_data + calculator -> market_analytics
+        ai_assistant + calculator, form_analytics, projection or market_analytics -> ai.*
+        text_rounds, chart.*, ai.* -> slides -> report (PDF and the extra formats)
+
+    Parameters are those of generate_league_report().
+
+    :return: tuple - (Pipeline, list of the target stage names).
+    """
+    from pipeline import Pipeline
+    from slides import REPORT_FORMATS, build_slides
+
+    pipeline = Pipeline(cache_dir=os.path.join(output_dir, "pipeline_cache"))
+    chart_options = {"untracked": {"output_dir": output_dir},
+                     "params": {"save_chart_images": save_chart_images}}
+    chart_outputs = {}
+    if save_chart_images:
+        from data_loader import POINTS_LABEL_COLUMN, read_header
+
+        # A saved chart whose PNG was deleted is rendered again. Big leagues
+        # have no projection, so they never write its PNG
+        chart_outputs = {chart: [os.path.join(output_dir, file_name)]
+                         for chart, file_name in CHART_IMAGE_FILES.items()}
+        if len(read_header(points_csv_path, POINTS_LABEL_COLUMN)) - 1 > BIG_LEAGUE_TEAMS:
+            del chart_outputs["projection"]
+
+    # The calculator keeps its own incremental state, and the analytics and
+    # projection are cheap, so their values are recomputed instead of stored
+    calculator = pipeline.add("calculator", compute_stats, files=[points_csv_path],
+                              untracked={"points_csv_path": points_csv_path,
+                                         "output_dir": output_dir},
+                              cache=False)
+    form_analytics = pipeline.add("form_analytics", compute_form_analytics, [calculator],
+                                  cache=False)
+    projection = pipeline.add("projection", compute_projection, [calculator],
+                              params={"total_rounds": total_rounds}, cache=False)
+    text_rounds = pipeline.add("text_rounds", get_text_rounds, [calculator])
+    charts = [
+        pipeline.add(f"chart.{chart}", render_chart, [source],
+                     untracked=chart_options["untracked"],
+                     params=dict(chart_options["params"], chart=chart),
+                     outputs=chart_outputs.get(chart, ()))
+        for chart, source in (("position", calculator), ("points", calculator),
+                              ("form", form_analytics), ("projection", projection))
     ]
-    if include_market_data:
-        ai_questions_list.append(
-            {
-                "readable_question": "El mercado",
-                "ai_question": "Dime un dato curioso y relevante sobre el número de operaciones en el mercado de fichajes por cada equipo: ",
-                "data": market_data_dict
-            }
-        )
-    ai_answers_list = []
-    open_ai_api_token = os.getenv('OPEN_AI_API_TOKEN')
+    ai_sources = {"highlights": [calculator], "curiosity": [calculator],
+                  "trends": [form_analytics], "prediction": [calculator, projection]}
+
+    market_chart = None
+    if market_csv_path is not None:
+        market_data = pipeline.add("market_data", compute_market_data,
+                                   files=[market_csv_path],
+                                   untracked={"market_csv_path": market_csv_path,
+                                              "output_dir": output_dir})
+        # The chart only depends on the market data, new rounds do not render it again
+        market_chart = pipeline.add("chart.market", render_chart, [market_data],
+                                    untracked=chart_options["untracked"],
+                                    params=dict(chart_options["params"], chart="market"),
+                                    outputs=chart_outputs.get("market", ()))
+        market_analytics = pipeline.add("market_analytics", compute_market_analytics,
+                                        [market_data, calculator], cache=False)
+        ai_sources["market"] = [market_analytics]
+
+    ai_answers = []
     if open_ai_api_token:
-        ai_data_assistant = OpenAIDataAssistant(api_token=open_ai_api_token)
-        for question in ai_questions_list:
-            answer = ai_data_assistant.ask_insight(f"{question.get('ai_question')}: {question.get('data')}")
-            ai_answers_list.append(f'{question.get("readable_question")}\nIA: "{answer}"')
-
-    # Create PDF presentation:
-    pdf_report_file = PDFPresentation(
-        filename=os.path.join(base_dir,
-            "generated_files",
-            "league_report.pdf"
-            )
+        # The token is not part of the fingerprint: a new token gives the same answers
+        ai_data_assistant = pipeline.add("ai_assistant", create_ai_data_assistant,
+                                         params={"open_ai_model": open_ai_model},
+                                         untracked={"open_ai_api_token": open_ai_api_token,
+                                                    "output_dir": output_dir,
+                                                    "ai_client": ai_client},
+                                         cache=False)
+        ai_answers = [
+            pipeline.add(f"ai.{kind}", ask_ai_question, [ai_data_assistant] + sources,
+                         params={"kind": kind})
+            for kind, sources in ai_sources.items()
+        ]
+
+    slides = charts + [text_rounds] + ([market_chart] if market_chart else []) + ai_answers
+    slide_kinds = (["image"] * len(charts) + ["texts"] + (["image"] if market_chart else [])
+                   + ["text"] * len(ai_answers))
+    # The slides are built once and shared by every format, charts are not rendered again
+    slide_model = pipeline.add("slides", build_slides, slides, params={"slide_kinds": slide_kinds})
+    report_formats = ["pdf"] + [report_format for report_format in extra_report_formats
+                                if report_format != "pdf"]
+    targets = [pipeline.add(
+        "report", export_report, [slide_model], params={"report_formats": report_formats},
+        untracked={"output_dir": output_dir},
+        outputs=[os.path.join(output_dir, REPORT_FORMATS[report_format])
+                 for report_format in report_formats]
+    )]
+    if export_json_format:
+        json_file_path = os.path.join(output_dir, f"points_stats.{export_json_format}")
+        targets.append(pipeline.add(
+            "export_json", export_stats_json, [calculator],
+            params={"json_format": export_json_format},
+            untracked={"json_file_path": json_file_path}, outputs=[json_file_path]
+        ))
+    if save_chart_images:
+        # Otherwise a cached report would not even check the charts' files
+        targets += charts + ([market_chart] if market_chart else [])
+    return pipeline, targets
+
+
+def generate_league_report(points_csv_path, output_dir, market_csv_path=None,
+                           open_ai_api_token=None, save_chart_images=False,
+                           export_json_format=None, total_rounds=38,
+                           open_ai_model="gpt-3.5-turbo", ai_client=None, extra_report_formats=()):
+    """
+    Runs the whole pipeline for one league: stats, graphics, AI insights
+    and the PDF report. Only the stages whose inputs changed since the last
+    run are executed, and independent stages run concurrently.
+
+    :param points_csv_path: str - Path to the CSV points per round file.
+    :param output_dir: str - Folder where the generated files are written.
+    :param market_csv_path: str - Path to the CSV market data file. If None,
+        market data is not included in the report.
+    :param open_ai_api_token: str - OpenAI API token. If None, the report
+        has no AI insights.
+    :param save_chart_images: bool - If True, the charts are also saved as PNG
+        files. Otherwise they are handed to the PDF in memory.
+    :param export_json_format: str - If 'json' or 'jsonl', the stats are also
+        exported to generated_files/points_stats.<format>.
+    :param total_rounds: int - Number of rounds of the whole season, for the projection.
+    :param open_ai_model: str - Model used for the AI insights.
+    :param ai_client: Object with the OpenAI client interface, used instead of a
+        real OpenAI client (e.g. an offline stub). Give it its own open_ai_model,
+        so its answers are cached apart from the real ones.
+    :param extra_report_formats: list - Formats rendered besides the PDF, from the
+        same slides: 'html' (a self-contained page) and/or 'png' (one image per slide).
+    :return: str - Path to the generated PDF report.
+    """
+    pipeline, targets = build_report_pipeline(
+        points_csv_path, output_dir, market_csv_path, open_ai_api_token,
+        save_chart_images, export_json_format, total_rounds, open_ai_model, ai_client,
+        extra_report_formats
     )
-    pdf_report_file.add_text_slide(
-        text="Informe de la Liga",
+    return pipeline.run(targets)["report"]["pdf"]
+
+
+def format_standings(calculator):
+    lines = [f"Clasificación tras la jornada {calculator.rounds[-1]}:"]
+    for position, team_index in enumerate(calculator.standings[-1].tolist(), start=1):
+        lines.append(f"{position:>3}. {calculator.teams[team_index]:<30} "
+                     f"{calculator.aggregated_points[-1][team_index]:>6}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fantasy league stats and reports.")
+    parser.add_argument("--base-dir", default=None,
+                        help="Project root directory, with the 'dataset' folder (default: BASE_DIR env var)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print the import time of each module the command needs")
+    parser.add_argument("--export-json", choices=["json", "jsonl"], default=None,
+                        help="Also export the stats to generated_files/points_stats.<format>")
+    parser.add_argument("--run-report", default=None, metavar="PATH",
+                        help="Write the timings and memory of every pipeline stage as JSON")
+    parser.add_argument("--extra-formats", nargs="+", choices=["html", "png"], default=[],
+                        help="Also render the report as a self-contained HTML page and/or "
+                             "one PNG image per slide")
+    parser.add_argument("--archive-path", default=None,
+                        help="SQLite archive of past seasons (default: ARCHIVE_PATH env var "
+                             "or archive/seasons.sqlite in the project root directory)")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("stats", help="Compute the stats and print the standings")
+    subparsers.add_parser("charts", help="Compute the stats and save the charts")
+    subparsers.add_parser("report", help="Generate the full PDF report (default)")
+    archive_parser = subparsers.add_parser("archive", help="Store the season in the all-time archive")
+    archive_parser.add_argument("--season", required=True, help="Season name (e.g. 2025-26)")
+    archive_parser.add_argument("--league", default=None,
+                                help="League name (default: name of the project root directory)")
+    archive_parser.add_argument("--finished", action="store_true",
+                                help="The season is over: its leader counts as a title")
+    subparsers.add_parser("records", help="Print the all-time records of the archived seasons")
+    args = parser.parse_args(argv)
+    command = args.command or "report"
+
+    # Cargar variables de entorno desde .env
+    from dotenv import load_dotenv
+    load_dotenv()
+    # BASE_DIR env variable should point to the
+    # project root directory:
+    base_dir = args.base_dir or os.getenv("BASE_DIR")
+    if not base_dir:
+        parser.error("the project root directory is required (--base-dir or BASE_DIR env var)")
+    # Check if we have to include market data:
+    include_market_data = str(os.getenv('INCLUDE_MARKET_DATA')).lower() == "true"
+    open_ai_api_token = os.getenv('OPEN_AI_API_TOKEN')
+    # Number of rounds of the whole season, for the final standings projection
+    total_rounds = int(os.getenv('TOTAL_ROUNDS') or 38)
+
+    if args.profile_startup:
+        module_names = list(STAGE_MODULES[command])
+        if command == "report" and open_ai_api_token:
+            module_names.append("openai")
+        timings = profile_imports(module_names)
+        for module_name, seconds in timings:
+            print(f"{module_name:<20} {seconds * 1000:>9.1f} ms")
+        print(f"{'total':<20} {sum(seconds for _, seconds in timings) * 1000:>9.1f} ms")
+
+    # Path to the CSV points per round file
+    csv_points_path = os.path.join(
+        base_dir,
+        "dataset",
+        "points.csv"
     )
-    for image_file_path in generated_file_paths:
-        pdf_report_file.add_image_slide(
-            image_path=image_file_path
-        )
-    for text_round in text_rounds_list:
-        pdf_report_file.add_text_slide(
-            text=text_round
-        )
+    # Path to the CSV market data file
+    csv_market_path = None
     if include_market_data:
-        pdf_report_file.add_image_slide(
-            image_path=graficator.plot_market_moves_bar(market_data_dict)
+        csv_market_path = os.path.join(
+            base_dir,
+            "dataset",
+            "market.csv"
         )
-    for ai_answer in ai_answers_list:
-        pdf_report_file.add_text_slide(
-            text=ai_answer
+    output_dir = os.path.join(base_dir, "generated_files")
+    # The archive lives outside generated_files, it keeps every past season
+    archive_path = (args.archive_path or os.getenv("ARCHIVE_PATH")
+                    or os.path.join(base_dir, "archive", "seasons.sqlite"))
+
+    from instrumentation import profiler
+    profiler.reset()
+    if command == "stats":
+        calculator = compute_stats(csv_points_path, output_dir)
+        print(format_standings(calculator))
+        if args.export_json:
+            json_file_path = calculator.export_json(
+                os.path.join(output_dir, f"points_stats.{args.export_json}"),
+                json_format=args.export_json
+            )
+            print(f"Stats exported at: {json_file_path}")
+    elif command == "archive":
+        league = args.league or os.path.basename(os.path.normpath(base_dir))
+        if archive_season(csv_points_path, output_dir, archive_path, league, args.season,
+                          finished=args.finished):
+            print(f"Season {args.season} of {league} archived at: {archive_path}")
+        else:
+            print(f"Season {args.season} of {league} was already archived")
+    elif command == "records":
+        from season_archive import SeasonArchive
+        from stats_calculator import PointsStatsCalculator
+
+        with SeasonArchive(archive_path) as archive:
+            print(PointsStatsCalculator.get_verbose_all_time_records(archive))
+    elif command == "charts":
+        calculator = compute_stats(csv_points_path, output_dir)
+        market_data = None
+        if include_market_data:
+            market_data = compute_market_data(csv_market_path, output_dir)
+        projection = compute_projection(calculator, total_rounds)
+        for image_path in render_charts(calculator, output_dir, market_data,
+                                        projection=projection):
+            print(f"Chart generated at: {image_path}")
+    else:
+        from slides import REPORT_FORMATS
+
+        pdf_report_path = generate_league_report(
+            points_csv_path=csv_points_path,
+            output_dir=output_dir,
+            market_csv_path=csv_market_path,
+            open_ai_api_token=open_ai_api_token,
+            save_chart_images=str(os.getenv('SAVE_CHART_IMAGES')).lower() == "true",
+            export_json_format=args.export_json,
+            total_rounds=total_rounds,
+            extra_report_formats=args.extra_formats
         )
-    pdf_report_file.save()
-    print(f"PDF report generated at: {pdf_report_file.filename}")
+        print(f"PDF report generated at: {pdf_report_path}")
+        for report_format in args.extra_formats:
+            print(f"{report_format.upper()} report generated at: "
+                  f"{os.path.join(output_dir, REPORT_FORMATS[report_format])}")
+    if args.run_report:
+        profiler.write_report(args.run_report)
+        print(f"Run report generated at: {args.run_report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
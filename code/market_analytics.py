@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+from data_loader import MARKET_LABEL_COLUMN, SPANISH_MONTHS, parse_month_labels, to_count_matrix
+
+MONTH_NAMES = {number: name.capitalize() for name, number in reversed(SPANISH_MONTHS.items())}
+
+
+def get_moves_matrix(market_df):
+    """
+    :param market_df: pd.DataFrame - Market data ('Mes' column plus one column per team).
+    :return: tuple - (teams, month x team matrix of moves). Non numeric and empty cells count as 0.
+    """
+    teams = list(market_df.columns[1:])
+    # One conversion for the whole table instead of one per column
+    return teams, to_count_matrix(market_df[teams])
+
+
+def split_market_dataframe(market_df):
+    """
+    Splits a market DataFrame ('Mes' column plus one column per team) into
+    its months, team names and month x team matrix of moves (see get_moves_matrix).
+    A (months, teams, moves) tuple, as returned by data_loader.load_market(),
+    is returned as it is.
+
+    :param market_df: pd.DataFrame or tuple - Market data.
+    :return: tuple - (months as datetime64[M], teams, moves).
+    """
+    if not isinstance(market_df, pd.DataFrame):
+        months, teams, moves = market_df
+        return np.asarray(months, dtype="datetime64[M]"), list(teams), np.asarray(moves, dtype=np.int64)
+    teams, moves = get_moves_matrix(market_df)
+    return parse_month_labels(market_df[MARKET_LABEL_COLUMN]), teams, moves
+
+
+def format_month(month):
+    """
+    :param month: np.datetime64 - Month.
+    :return: str - Month label as in the CSV files (e.g. 'Septiembre 2025').
+    """
+    months_since_epoch = int(month.astype("datetime64[M]").astype(np.int64))
+    return f"{MONTH_NAMES[months_since_epoch % 12 + 1]} {1970 + months_since_epoch // 12}"
+
+
+def column_correlations(x, y):
+    """
+    Pearson correlation of each column of x with the same column of y.
+
+    :return: np.ndarray - One correlation per column, NaN where a column is constant.
+    """
+    x_centered = x - x.mean(axis=0)
+    y_centered = y - y.mean(axis=0)
+    denominator = np.sqrt((x_centered ** 2).sum(axis=0) * (y_centered ** 2).sum(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator > 0, (x_centered * y_centered).sum(axis=0) / denominator, np.nan)
+
+
+class MarketAnalytics:
+    """
+    Market activity metrics on the month x team matrix of moves (months sorted
+    ascending):
+    - monthly_activity: total moves of the league in each month.
+    - cumulative_moves: moves of each team up to each month.
+    - activity_share: share of each month's moves made by each team.
+    - total_share: share of all the moves made by each team.
+    With a PointsStatsCalculator, it also correlates each team's monthly moves
+    with the points it scored and the positions it gained in the same month:
+    - points_correlation and position_correlation, one value per team (NaN
+      if it cannot be computed, e.g. a team that always made the same moves).
+    """
+    def __init__(self, market_data, calculator=None, round_months=None):
+        """
+        :param market_data: pd.DataFrame or tuple - Market data (see split_market_dataframe).
+        :param calculator: PointsStatsCalculator - Points data to correlate with (optional).
+        :param round_months: array-like - Month (datetime64[M]) of each calculator round.
+            The CSV files have no dates, so by default the rounds are spread evenly
+            over the market months, by round number.
+        """
+        months, self.teams, moves = split_market_dataframe(market_data)
+        order = np.argsort(months, kind="stable")
+        self.months = months[order]
+        self.moves = moves[order]
+        self.monthly_activity = self.moves.sum(axis=1)
+        self.cumulative_moves = np.cumsum(self.moves, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.activity_share = np.nan_to_num(self.moves / self.monthly_activity[:, np.newaxis])
+        total_moves = self.moves.sum()
+        self.total_share = self.moves.sum(axis=0) / total_moves if total_moves else np.zeros(len(self.teams))
+
+        self.points_correlation = None
+        self.position_correlation = None
+        if calculator is not None:
+            self.__correlate(calculator, round_months)
+
+    def __correlate(self, calculator, round_months):
+        n_months = len(self.months)
+        rounds = np.asarray(calculator.rounds)
+        if round_months is not None:
+            round_month_index = np.searchsorted(self.months, np.asarray(round_months, dtype="datetime64[M]"))
+            is_known = (round_month_index < n_months)
+            is_known[is_known] &= self.months[round_month_index[is_known]] == np.asarray(
+                round_months, dtype="datetime64[M]")[is_known]
+            round_month_index = np.where(is_known, round_month_index, -1)
+        else:
+            span = rounds.max() - rounds.min() + 1
+            round_month_index = (rounds - rounds.min()) * n_months // span
+
+        # Market teams that are also in the points data
+        columns = {team: column for column, team in enumerate(calculator.teams)}
+        market_columns = [index for index, team in enumerate(self.teams) if team in columns]
+        points_columns = [columns[self.teams[index]] for index in market_columns]
+
+        # Points scored in each month: month x round one-hot matrix times the round x team
+        # points, in column chunks (the points matrix may be memory-mapped, in big leagues)
+        month_rounds = (round_month_index[np.newaxis, :] == np.arange(n_months)[:, np.newaxis])
+        monthly_points = np.empty((n_months, len(points_columns)), dtype=np.int64)
+        chunk_columns = max(calculator.chunk_cells // max(len(rounds), 1), 1)
+        for start in range(0, len(points_columns), chunk_columns):
+            columns = points_columns[start:start + chunk_columns]
+            monthly_points[:, start:start + len(columns)] = (
+                month_rounds @ np.asarray(calculator.round_points[:, columns]))
+        # Positions gained in each month, from the last round of the previous one
+        month_end_rows = np.maximum.accumulate(
+            np.where(month_rounds, np.arange(len(rounds))[np.newaxis, :], -1).max(axis=1))
+        month_end_positions = np.asarray(calculator.positions[month_end_rows])[:, points_columns]
+        position_gain = np.zeros(monthly_points.shape)
+        position_gain[1:] = month_end_positions[:-1] - month_end_positions[1:]
+        # Only months with rounds count, and the first one has no previous position
+        is_valid = month_rounds.any(axis=1)
+        is_valid_gain = is_valid & (month_end_rows >= 0) & (np.roll(month_end_rows, 1) >= 0)
+        is_valid_gain[0] = False
+
+        market_moves = self.moves[:, market_columns].astype(np.float64)
+        self.points_correlation = np.full(len(self.teams), np.nan)
+        self.position_correlation = np.full(len(self.teams), np.nan)
+        if is_valid.sum() >= 2:
+            self.points_correlation[market_columns] = column_correlations(
+                market_moves[is_valid], monthly_points[is_valid].astype(np.float64))
+        if is_valid_gain.sum() >= 2:
+            self.position_correlation[market_columns] = column_correlations(
+                market_moves[is_valid_gain], position_gain[is_valid_gain])
+
+    def get_movements_dict(self):
+        """
+        :return: dict - Total market moves of each team.
+        """
+        return dict(zip(self.teams, self.moves.sum(axis=0).tolist()))
+
+    def get_heatmap_data(self, max_teams=40):
+        """
+        Returns the moves per month and team for Graficator.plot_market_heatmap,
+        with the teams sorted by total moves (only the max_teams most active ones).
+
+        :return: dict - 'months' labels, 'teams' and their 'moves' (one list per team).
+        """
+        order = np.argsort(-self.moves.sum(axis=0), kind="stable")[:max_teams]
+        return {
+            "months": [format_month(month) for month in self.months],
+            "teams": [self.teams[team_index] for team_index in order.tolist()],
+            "moves": self.moves[:, order].T.tolist(),
+        }
+
+    def get_summary(self, max_teams=None):
+        """
+        Returns the market metrics in a compact, columnar form, with the teams
+        sorted by total moves (e.g. to send it to an AI model).
+
+        :param max_teams: int - Only the max_teams most active teams (default: all of them).
+        :return: dict - League 'months' and 'monthly_activity', plus lists per team metric.
+        """
+        total_moves = self.moves.sum(axis=0)
+        order = np.argsort(-total_moves, kind="stable")[:max_teams]
+        summary = {
+            "months": [format_month(month) for month in self.months],
+            "monthly_activity": self.monthly_activity.tolist(),
+            "team": [self.teams[team_index] for team_index in order.tolist()],
+            "moves": total_moves[order].tolist(),
+            "share": np.round(self.total_share[order], 3).tolist(),
+        }
+        if self.points_correlation is not None:
+            for name, correlation in (("points_correlation", self.points_correlation),
+                                      ("position_correlation", self.position_correlation)):
+                summary[name] = [None if np.isnan(value) else value
+                                 for value in np.round(correlation[order], 2).tolist()]
+        return summary
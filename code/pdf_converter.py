@@ -1,7 +1,48 @@
+from functools import lru_cache
 from reportlab.lib.pagesizes import landscape, A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase.pdfmetrics import stringWidth
+from PIL import Image
+from instrumentation import profiler
+
+@lru_cache(maxsize=65536)
+def word_width(word, font, font_size):
+    """
+    Width of a word (or any string) in points, memoized per (word, font, size).
+    """
+    return stringWidth(word, font, font_size)
+
+
+def wrap_lines(text, font, font_size, max_width):
+    """
+    Wraps a single paragraph into lines no wider than max_width. Each word is
+    measured once and line widths are added up incrementally. A word wider than
+    max_width gets a line of its own.
+    :param text: Paragraph to wrap (newlines are treated as spaces).
+    :param font: Font of the text.
+    :param font_size: Font size of the text.
+    :param max_width: Maximum line width in points.
+    :return: List of lines.
+    """
+    space_width = word_width(" ", font, font_size)
+    lines = []
+    current_words = []
+    current_width = 0
+    for word in text.split():
+        width = word_width(word, font, font_size)
+        if not current_words:
+            current_words, current_width = [word], width
+        elif current_width + space_width + width <= max_width:
+            current_words.append(word)
+            current_width += space_width + width
+        else:
+            lines.append(" ".join(current_words))
+            current_words, current_width = [word], width
+    if current_words:
+        lines.append(" ".join(current_words))
+    return lines
+
 
 class PDFPresentation:
     def __init__(self, filename, page_size=landscape(A4)):
@@ -12,20 +53,28 @@ class PDFPresentation:
         """
         self.filename = filename
         self.page_size = page_size
-        self.c = canvas.Canvas(filename, pagesize=page_size)
+        # Compressed page streams keep the finished pages small while the
+        # rest of the report is being built
+        self.c = canvas.Canvas(filename, pagesize=page_size, pageCompression=1)
         self.width, self.height = page_size
         self._first_slide = True
 
+    @profiler.timed("pdf.image_slide")
     def add_image_slide(self, image_path, scale_to_fit=True):
         """
         Adds a slide that is just an image.
-        :param image_path: Path to the image.
+        :param image_path: Path to the image, in-memory image file (e.g. io.BytesIO)
+            or RGB/RGBA numpy array.
         :param scale_to_fit: If True, scales the image to fit the page.
         """
         if self._first_slide:
             self._first_slide = False
         else:
             self.c.showPage()
+        if hasattr(image_path, 'seek'):
+            image_path.seek(0)
+        elif hasattr(image_path, '__array_interface__'):
+            image_path = Image.fromarray(image_path)
         img = ImageReader(image_path)
         iw, ih = img.getSize()
         if scale_to_fit:
@@ -41,19 +90,17 @@ class PDFPresentation:
             self.c.drawImage(img, x, y)
     
 
+    @profiler.timed("pdf.text_slide")
     def add_text_slide(self, text, font="Helvetica-Bold", font_size=36, margin=40, body_font_size=None):
         """
         Adds a slide with centered, wrapped text. The first line (before first '\n') is the title (large font), the rest is body (smaller font).
+        If the body does not fit in one page, it continues in the next pages, repeating the title.
         :param text: Text to display. First line is title, rest is body.
         :param font: Font of the text.
         :param font_size: Font size for the title.
         :param margin: Margin from page sides.
         :param body_font_size: Font size for the body text (default: font_size * 0.6)
         """
-        if self._first_slide:
-            self._first_slide = False
-        else:
-            self.c.showPage()
         max_width = self.width - 2 * margin
         if body_font_size is None:
             body_font_size = int(font_size * 0.6)
@@ -65,43 +112,34 @@ class PDFPresentation:
             title, body = text, ""
 
         # Prepare title lines (wrap if needed)
-        self.c.setFont(font, font_size)
-        title_lines = []
-        words = title.split()
-        current_line = ""
-        for word in words:
-            test_line = current_line + (" " if current_line else "") + word
-            if stringWidth(test_line, font, font_size) <= max_width:
-                current_line = test_line
-            else:
-                if current_line:
-                    title_lines.append(current_line)
-                current_line = word
-        if current_line:
-            title_lines.append(current_line)
+        title_lines = wrap_lines(title, font, font_size, max_width)
 
         # Prepare body lines (wrap and respect explicit newlines)
         body_lines = []
         if body:
-            self.c.setFont(font, body_font_size)
             paragraphs = body.split('\n')
-            for para in paragraphs:
-                words = para.split()
-                current_line = ""
-                for word in words:
-                    test_line = current_line + (" " if current_line else "") + word
-                    if stringWidth(test_line, font, body_font_size) <= max_width:
-                        current_line = test_line
-                    else:
-                        if current_line:
-                            body_lines.append(current_line)
-                        current_line = word
-                if current_line:
-                    body_lines.append(current_line)
+            for index, para in enumerate(paragraphs):
+                body_lines.extend(wrap_lines(para, font, body_font_size, max_width))
                 # After each paragraph, add a blank line (except after last)
-                if para != paragraphs[-1]:
+                if index < len(paragraphs) - 1:
                     body_lines.append("")
 
+        # Split the body in as many pages as needed
+        title_height = len(title_lines) * font_size * 1.2
+        body_line_height = body_font_size * 1.2
+        lines_per_page = max(int((self.height - 2 * margin - title_height) // body_line_height), 1)
+        pages = [body_lines[i:i + lines_per_page]
+                 for i in range(0, len(body_lines), lines_per_page)] or [[]]
+
+        for page_body_lines in pages:
+            self.__draw_text_page(title_lines, page_body_lines, font, font_size, body_font_size)
+
+    def __draw_text_page(self, title_lines, body_lines, font, font_size, body_font_size):
+        if self._first_slide:
+            self._first_slide = False
+        else:
+            self.c.showPage()
+
         # Calculate total height for centering
         total_height = len(title_lines) * font_size * 1.2 + (len(body_lines) * body_font_size * 1.2 if body_lines else 0)
         y = (self.height + total_height) / 2 - font_size
@@ -109,20 +147,17 @@ class PDFPresentation:
         # Draw title lines
         self.c.setFont(font, font_size)
         for line in title_lines:
-            text_width = stringWidth(line, font, font_size)
-            x = (self.width - text_width) / 2
-            self.c.drawString(x, y, line)
+            self.c.drawCentredString(self.width / 2, y, line)
             y -= font_size * 1.2
 
         # Draw body lines
         if body_lines:
             self.c.setFont(font, body_font_size)
             for line in body_lines:
-                text_width = stringWidth(line, font, body_font_size)
-                x = (self.width - text_width) / 2
-                self.c.drawString(x, y, line)
+                self.c.drawCentredString(self.width / 2, y, line)
                 y -= body_font_size * 1.2
 
+    @profiler.timed("pdf.save")
     def save(self):
         """
         Saves the PDF to disk.
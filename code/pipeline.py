@@ -0,0 +1,175 @@
+import os
+import json
+import pickle
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from data_loader import file_sha256
+from instrumentation import profiler
+
+# Bump it when a stage's output changes for the same inputs, to invalidate cached artifacts
+PIPELINE_VERSION = 1
+
+
+class Stage:
+    def __init__(self, name, function, inputs=(), params=None, untracked=None, files=(),
+                 outputs=(), cache=True):
+        """
+        :param name: str - Unique name of the stage.
+        :param function: callable - Called with the values of the inputs (positionally, in
+            order) and the params and untracked params (as keyword arguments).
+        :param inputs: list - Names of the stages whose values the function needs.
+        :param params: dict - Keyword arguments that are part of the fingerprint.
+        :param untracked: dict - Keyword arguments that do not change the result
+            (e.g. folders or API tokens), left out of the fingerprint.
+        :param files: list - Input files, fingerprinted by their content.
+        :param outputs: list - Files the stage writes. Its cached value is only
+            reused if all of them still exist.
+        :param cache: bool - If False, the value is never stored, and the stage runs
+            whenever a stage depending on it has to run (for cheap stages, or values
+            too big to store).
+        """
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.params = params or {}
+        self.untracked = untracked or {}
+        self.files = list(files)
+        self.outputs = list(outputs)
+        self.cache = cache
+
+
+class Pipeline:
+    """
+    A small DAG of stages with declared inputs and outputs. Every stage gets a
+    fingerprint from its params, the content of its input files and the
+    fingerprints of the stages it depends on. A run only executes the stages
+    whose fingerprint has no cached artifact (plus the uncached stages they
+    need), and independent stages run concurrently in a thread pool.
+    """
+    def __init__(self, cache_dir, max_workers=8):
+        """
+        :param cache_dir: str - Folder for the pickled stage values.
+        :param max_workers: int - Maximum number of stages running at the same time.
+        """
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.stages = {}
+        self.statuses = {}
+
+    def add(self, name, function, inputs=(), **options):
+        """
+        Adds a stage (see Stage for the options). Its inputs must be added first.
+
+        :return: str - The stage name, to use it as an input of later stages.
+        """
+        if name in self.stages:
+            raise ValueError(f"Duplicated pipeline stage: {name}")
+        missing = [input_name for input_name in inputs if input_name not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+        self.stages[name] = Stage(name, function, inputs, **options)
+        return name
+
+    def fingerprints(self):
+        """
+        :return: dict - Fingerprint of every stage. Stages are added after their
+            inputs, so the insertion order is a topological order.
+        """
+        fingerprints = {}
+        for name, stage in self.stages.items():
+            key = json.dumps([
+                PIPELINE_VERSION,
+                name,
+                stage.params,
+                [file_sha256(path) for path in stage.files],
+                [fingerprints[input_name] for input_name in stage.inputs],
+            ], sort_keys=True, default=str)
+            fingerprints[name] = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return fingerprints
+
+    def run(self, targets=None):
+        """
+        Runs the pipeline, reusing the cached values of the stages that did
+        not change. After the run, statuses maps every stage that was needed
+        to 'executed' or 'cached'.
+
+        :param targets: list - Stages whose values are wanted (default: all of them).
+        :return: dict - Value of each target stage.
+        """
+        if targets is None:
+            targets = list(self.stages)
+        fingerprints = self.fingerprints()
+
+        # Walk the graph backwards: a needed stage either has a cached value
+        # or runs, and then its inputs are needed too
+        needed = set(targets)
+        to_execute = []
+        to_load = []
+        for name in reversed(list(self.stages)):
+            if name not in needed:
+                continue
+            stage = self.stages[name]
+            if stage.cache and self.__is_cached(stage, fingerprints[name]):
+                to_load.append(name)
+            else:
+                to_execute.append(name)
+                needed.update(stage.inputs)
+        to_execute.reverse()
+        self.statuses = {name: "cached" for name in to_load}
+
+        values = {}
+        for name in to_load:
+            with profiler.stage(f"pipeline.{name}", cached=True):
+                values[name] = self.__load(name, fingerprints[name])
+
+        pending = list(to_execute)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    stage = self.stages[name]
+                    if all(input_name in values for input_name in stage.inputs):
+                        pending.remove(name)
+                        future = executor.submit(self.__execute, stage,
+                                                 [values[input_name] for input_name in stage.inputs])
+                        running[future] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    # Re-raises the stage error, after the running stages finish
+                    values[name] = future.result()
+                    self.statuses[name] = "executed"
+                    if self.stages[name].cache:
+                        self.__store(name, fingerprints[name], values[name])
+        return {name: values[name] for name in targets}
+
+    @staticmethod
+    def __execute(stage, input_values):
+        with profiler.stage(f"pipeline.{stage.name}", cached=False):
+            return stage.function(*input_values, **stage.params, **stage.untracked)
+
+    def __artifact_path(self, name, fingerprint):
+        return os.path.join(self.cache_dir, f"{name}-{fingerprint[:32]}.pkl")
+
+    def __is_cached(self, stage, fingerprint):
+        return (os.path.exists(self.__artifact_path(stage.name, fingerprint))
+                and all(os.path.exists(path) for path in stage.outputs))
+
+    def __load(self, name, fingerprint):
+        with open(self.__artifact_path(name, fingerprint), "rb") as f:
+            return pickle.load(f)
+
+    def __store(self, name, fingerprint, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        artifact_path = self.__artifact_path(name, fingerprint)
+        tmp_path = f"{artifact_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, artifact_path)
+        # Only the last artifact of each stage is kept
+        prefix = f"{name}-"
+        for file_name in os.listdir(self.cache_dir):
+            if (file_name.startswith(prefix) and file_name.endswith(".pkl")
+                    and os.path.join(self.cache_dir, file_name) != artifact_path
+                    and "-" not in file_name[len(prefix):-len(".pkl")]):
+                os.remove(os.path.join(self.cache_dir, file_name))
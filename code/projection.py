@@ -0,0 +1,141 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from instrumentation import profiler
+
+# Simulated round x team cells per chunk (about 16 MB of float32)
+DEFAULT_CHUNK_CELLS = 1 << 22
+
+
+def _simulate_chunks(current_points, means, stds, n_rounds, chunks):
+    """
+    Simulates the remaining rounds of the season, one chunk of simulations
+    at a time to bound the memory (a simulations x rounds x teams array per chunk).
+    It is a module function so it can run in a worker process.
+
+    :param chunks: list - (number of simulations, np.random.SeedSequence) tuples.
+    :return: np.ndarray - Teams x positions matrix with how many simulations
+        ended with each team in each position.
+    """
+    n_teams = len(means)
+    position_counts = np.zeros((n_teams, n_teams), dtype=np.int64)
+    team_offsets = np.arange(n_teams) * n_teams
+    for n_simulations, seed in chunks:
+        rng = np.random.default_rng(seed)
+        round_points = rng.standard_normal((n_simulations, n_rounds, n_teams), dtype=np.float32)
+        round_points *= stds
+        round_points += means
+        final_points = current_points + round_points.sum(axis=1)
+        # Same ranking as PointsStatsCalculator, along the teams axis
+        standings = np.argsort(-final_points, axis=1, kind="stable")
+        positions = np.empty_like(standings)
+        np.put_along_axis(positions, standings, np.arange(n_teams)[np.newaxis, :], axis=1)
+        position_counts += np.bincount(
+            (positions + team_offsets).ravel(), minlength=n_teams * n_teams
+        ).reshape(n_teams, n_teams)
+    return position_counts
+
+
+class StandingsProjection:
+    """
+    Monte Carlo projection of the final standings. Each team's round points
+    are modeled as a normal distribution fitted to its past rounds, and the
+    remaining rounds of the season are simulated many times to get the
+    probability of every team ending in every position.
+    """
+    def __init__(self, calculator, total_rounds=38):
+        """
+        :param calculator: PointsStatsCalculator - Season played so far.
+        :param total_rounds: int - Number of rounds of the whole season.
+        """
+        self.calculator = calculator
+        self.total_rounds = total_rounds
+        self.remaining_rounds = max(
+            total_rounds - int(np.count_nonzero(calculator.rounds <= total_rounds)), 0
+        )
+        round_points = np.asarray(calculator.round_points, dtype=np.float64)
+        self.means = round_points.mean(axis=0)
+        if len(round_points) > 1:
+            self.stds = round_points.std(axis=0, ddof=1)
+        else:
+            # A single round says nothing about each team's spread, use the league's
+            self.stds = np.full(len(calculator.teams), round_points.std())
+        self.n_simulations = 0
+        self.position_probabilities = None
+
+    @profiler.timed("projection.simulate")
+    def simulate(self, n_simulations=20000, seed=None, n_workers=1, chunk_size=None):
+        """
+        Runs the simulations. The result only depends on the seed and the
+        chunk size, not on the number of workers.
+
+        :param n_simulations: int - Number of simulated seasons.
+        :param seed: int - Seed of the random generator. If None, results change on every run.
+        :param n_workers: int - Number of processes the chunks are spread over (1 runs them here).
+        :param chunk_size: int - Simulations per chunk (default: as many as fit in DEFAULT_CHUNK_CELLS).
+        :return: np.ndarray - Teams x positions matrix of probabilities.
+        """
+        if chunk_size is None:
+            cells_per_simulation = max(self.remaining_rounds, 1) * len(self.calculator.teams)
+            chunk_size = max(DEFAULT_CHUNK_CELLS // cells_per_simulation, 1)
+        chunk_sizes = [chunk_size] * (n_simulations // chunk_size)
+        if n_simulations % chunk_size:
+            chunk_sizes.append(n_simulations % chunk_size)
+        chunks = list(zip(chunk_sizes, np.random.SeedSequence(seed).spawn(len(chunk_sizes))))
+        current_points = np.asarray(self.calculator.aggregated_points[-1], dtype=np.float32)
+        arguments = (current_points, self.means.astype(np.float32),
+                     self.stds.astype(np.float32), self.remaining_rounds)
+
+        if n_workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = [executor.submit(_simulate_chunks, *arguments, chunks[worker::n_workers])
+                           for worker in range(min(n_workers, len(chunks)))]
+                position_counts = sum(future.result() for future in futures)
+        else:
+            position_counts = _simulate_chunks(*arguments, chunks)
+
+        self.n_simulations = n_simulations
+        self.position_probabilities = position_counts / n_simulations
+        return self.position_probabilities
+
+    @property
+    def expected_positions(self):
+        n_teams = len(self.calculator.teams)
+        return self.position_probabilities @ np.arange(1, n_teams + 1)
+
+    def __projected_order(self):
+        # Teams sorted by expected final position, ties broken by current standings
+        current_positions = self.calculator.positions[-1]
+        return np.lexsort((current_positions, self.expected_positions))
+
+    def get_summary(self, top_n=3):
+        """
+        Returns the projection in a compact, columnar form, sorted by the
+        expected final position (e.g. to send it to an AI model).
+
+        :param top_n: int - Positions counted for the 'top_n' probability.
+        :return: dict - Lists per metric, plus the 'team' list.
+        """
+        order = self.__projected_order()
+        probabilities = self.position_probabilities[order]
+        return {
+            "simulations": self.n_simulations,
+            "remaining_rounds": self.remaining_rounds,
+            "top_n": top_n,
+            "team": [self.calculator.teams[team_index] for team_index in order.tolist()],
+            "current_position": self.calculator.positions[-1][order].tolist(),
+            "expected_position": np.round(self.expected_positions[order], 2).tolist(),
+            "title": np.round(probabilities[:, 0], 3).tolist(),
+            "top_n_probability": np.round(probabilities[:, :top_n].sum(axis=1), 3).tolist(),
+            "last": np.round(probabilities[:, -1], 3).tolist(),
+        }
+
+    def get_projection_dict(self):
+        """
+        :return: dict - 'teams' sorted by expected final position and their
+            'position_probabilities' (one list per team), for Graficator.plot_projected_standings.
+        """
+        order = self.__projected_order()
+        return {
+            "teams": [self.calculator.teams[team_index] for team_index in order.tolist()],
+            "position_probabilities": np.round(self.position_probabilities[order], 4).tolist(),
+        }
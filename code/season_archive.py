@@ -0,0 +1,341 @@
+import os
+import hashlib
+import sqlite3
+import numpy as np
+from instrumentation import profiler
+
+# Bump it when the tables or the aggregates change: older archives are rebuilt empty
+ARCHIVE_SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seasons (
+    season_id INTEGER PRIMARY KEY,
+    league TEXT NOT NULL,
+    season TEXT NOT NULL,
+    data_sha256 TEXT NOT NULL,
+    n_rounds INTEGER NOT NULL,
+    n_teams INTEGER NOT NULL,
+    finished INTEGER NOT NULL,
+    champion TEXT NOT NULL,
+    champion_points INTEGER NOT NULL,
+    mean_round_points REAL NOT NULL,
+    UNIQUE (league, season)
+);
+CREATE TABLE IF NOT EXISTS round_points (
+    season_id INTEGER NOT NULL,
+    round INTEGER NOT NULL,
+    team TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    aggregated_points INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (season_id, round, team)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS round_points_by_points ON round_points (points DESC);
+CREATE INDEX IF NOT EXISTS round_points_by_team ON round_points (team, points DESC);
+CREATE TABLE IF NOT EXISTS team_seasons (
+    season_id INTEGER NOT NULL,
+    team TEXT NOT NULL,
+    final_position INTEGER NOT NULL,
+    total_points INTEGER NOT NULL,
+    mean_points REAL NOT NULL,
+    best_round INTEGER NOT NULL,
+    best_round_points INTEGER NOT NULL,
+    worst_round INTEGER NOT NULL,
+    worst_round_points INTEGER NOT NULL,
+    longest_streak INTEGER NOT NULL,
+    longest_lead INTEGER NOT NULL,
+    PRIMARY KEY (season_id, team)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS team_seasons_by_team ON team_seasons (team);
+CREATE INDEX IF NOT EXISTS team_seasons_by_streak ON team_seasons (longest_streak DESC);
+CREATE INDEX IF NOT EXISTS team_seasons_by_lead ON team_seasons (longest_lead DESC);
+CREATE TABLE IF NOT EXISTS teams (
+    league TEXT NOT NULL,
+    team TEXT NOT NULL,
+    seasons INTEGER NOT NULL,
+    finished_seasons INTEGER NOT NULL,
+    titles INTEGER NOT NULL,
+    podiums INTEGER NOT NULL,
+    total_points INTEGER NOT NULL,
+    best_round_points INTEGER NOT NULL,
+    longest_streak INTEGER NOT NULL,
+    longest_lead INTEGER NOT NULL,
+    PRIMARY KEY (league, team)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS teams_by_titles ON teams (titles DESC, total_points DESC);
+"""
+
+STREAK_COLUMNS = {"streak": "longest_streak", "lead": "longest_lead"}
+
+
+def longest_runs(is_true):
+    """
+    :param is_true: np.ndarray - Rounds x teams boolean matrix.
+    :return: np.ndarray - Longest run of consecutive True rounds of each team.
+    """
+    if len(is_true) == 0:
+        return np.zeros(is_true.shape[1], dtype=np.int64)
+    counts = np.cumsum(is_true, axis=0)
+    # Count of True rounds at the last False round, carried forward
+    resets = np.maximum.accumulate(np.where(is_true, 0, counts), axis=0)
+    return (counts - resets).max(axis=0)
+
+
+class SeasonArchive:
+    """
+    Local SQLite store of finished (or ongoing) seasons of many leagues, for
+    all-time records. Every season keeps its round x team points, plus
+    aggregates computed once when it is ingested:
+    - team_seasons: final position, points, best and worst round and longest
+      streaks of each team in each season.
+    - teams: all-time totals of each team of each league (teams are identified
+      by league and name: two leagues may have teams with the same name).
+    Seasons still being played can be stored too, but only finished seasons
+    count for titles and podiums.
+    Queries read the indexes and aggregates, never the raw CSV files.
+    """
+    def __init__(self, archive_path):
+        """
+        :param archive_path: str - Path to the SQLite file (created if it does not exist).
+        """
+        self.archive_path = archive_path
+        directory = os.path.dirname(archive_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Several processes (e.g. the batch runner) may write at the same time
+        self.connection = sqlite3.connect(archive_path, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.__create_schema()
+
+    def __create_schema(self):
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] == ARCHIVE_SCHEMA_VERSION:
+            return
+        # Several processes may open a new archive at the same time: the write lock is
+        # taken first and the version read again, so only one of them creates the tables
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != ARCHIVE_SCHEMA_VERSION:
+                if version:
+                    for table in ("seasons", "round_points", "team_seasons", "teams"):
+                        self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+                # executescript() would commit first, so the statements run one by one
+                for statement in SCHEMA.split(";"):
+                    if statement.strip():
+                        self.connection.execute(statement)
+                self.connection.execute(f"PRAGMA user_version = {ARCHIVE_SCHEMA_VERSION}")
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            raise
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def data_sha256(calculator):
+        digest = hashlib.sha256()
+        digest.update(np.asarray(calculator.rounds, dtype=np.int64).tobytes())
+        digest.update("\0".join(calculator.teams).encode("utf-8"))
+        digest.update(np.asarray(calculator.round_points, dtype=np.int64).tobytes())
+        return digest.hexdigest()
+
+    @profiler.timed("archive.ingest")
+    def ingest(self, calculator, league, season, finished=False):
+        """
+        Stores a season, replacing the previous data of the same league and
+        season (e.g. a season still being played). Ingesting the same data
+        again does nothing.
+
+        :param calculator: PointsStatsCalculator - Points of the season.
+        :param league: str - League name.
+        :param season: str - Season name (e.g. '2025-26').
+        :param finished: bool - Whether the season is over. The leader of a
+            season still being played is not counted as a title.
+        :return: bool - True if the archive changed.
+        """
+        data_sha256 = self.data_sha256(calculator)
+        rounds = np.asarray(calculator.rounds)
+        teams = list(calculator.teams)
+        round_points = np.asarray(calculator.round_points, dtype=np.int64)
+        aggregated_points = np.asarray(calculator.aggregated_points)
+        positions = np.asarray(calculator.positions)
+        if not len(rounds):
+            raise ValueError(f"The season {season} of {league} has no rounds")
+
+        with self.connection:
+            # Write lock first: upgrading a read transaction could fail if another process writes
+            self.connection.execute("BEGIN IMMEDIATE")
+            row = self.connection.execute(
+                "SELECT season_id, data_sha256, finished FROM seasons WHERE league = ? AND season = ?",
+                (league, season)
+            ).fetchone()
+            if row is not None:
+                if row["data_sha256"] == data_sha256:
+                    if bool(row["finished"]) == finished:
+                        return False
+                    # Same rounds, but the season is now over (or reopened)
+                    self.connection.execute("UPDATE seasons SET finished = ? WHERE season_id = ?",
+                                            (int(finished), row["season_id"]))
+                    self.__refresh_teams()
+                    return True
+                for table in ("round_points", "team_seasons", "seasons"):
+                    self.connection.execute(f"DELETE FROM {table} WHERE season_id = ?",
+                                            (row["season_id"],))
+
+            champion_index = int(calculator.standings[-1][0])
+            season_id = self.connection.execute(
+                "INSERT INTO seasons (league, season, data_sha256, n_rounds, n_teams, finished, "
+                "champion, champion_points, mean_round_points) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (league, season, data_sha256, len(rounds), len(teams), int(finished),
+                 teams[champion_index],
+                 int(aggregated_points[-1][champion_index]), float(round_points.mean()))
+            ).lastrowid
+            # One round at a time, so big leagues never build every row at once
+            self.connection.executemany(
+                "INSERT INTO round_points VALUES (?, ?, ?, ?, ?, ?)",
+                ((season_id, round_number, team, points, aggregated, position)
+                 for row_index, round_number in enumerate(rounds.tolist())
+                 for team, points, aggregated, position in zip(
+                     teams, round_points[row_index].tolist(),
+                     aggregated_points[row_index].tolist(), positions[row_index].tolist()))
+            )
+            self.connection.executemany(
+                "INSERT INTO team_seasons VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self.__team_season_rows(season_id, rounds, teams, round_points,
+                                        aggregated_points, positions)
+            )
+            self.__refresh_teams()
+        return True
+
+    @staticmethod
+    def __team_season_rows(season_id, rounds, teams, round_points, aggregated_points, positions):
+        # Same streak as FormAnalytics: rounds scoring at least the round's mean points
+        is_good = round_points >= round_points.mean(axis=1, keepdims=True)
+        best_rows = np.argmax(round_points, axis=0)
+        worst_rows = np.argmin(round_points, axis=0)
+        columns = np.arange(len(teams))
+        return zip(
+            [season_id] * len(teams), teams,
+            positions[-1].tolist(),
+            aggregated_points[-1].tolist(),
+            round_points.mean(axis=0).tolist(),
+            rounds[best_rows].tolist(), round_points[best_rows, columns].tolist(),
+            rounds[worst_rows].tolist(), round_points[worst_rows, columns].tolist(),
+            longest_runs(is_good).tolist(),
+            longest_runs(positions == 1).tolist(),
+        )
+
+    def __refresh_teams(self):
+        # The per team totals are small (seasons x teams rows), so they are rebuilt whole.
+        # The position of a season still being played is not a title nor a podium yet
+        self.connection.execute("DELETE FROM teams")
+        self.connection.execute(
+            "INSERT INTO teams SELECT s.league, t.team, COUNT(*), SUM(s.finished), "
+            "SUM(s.finished AND t.final_position = 1), SUM(s.finished AND t.final_position <= 3), "
+            "SUM(t.total_points), MAX(t.best_round_points), MAX(t.longest_streak), "
+            "MAX(t.longest_lead) FROM team_seasons AS t JOIN seasons AS s USING (season_id) "
+            "GROUP BY s.league, t.team"
+        )
+
+    def remove(self, league, season):
+        """
+        :return: bool - True if the season was in the archive.
+        """
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            row = self.connection.execute(
+                "SELECT season_id FROM seasons WHERE league = ? AND season = ?", (league, season)
+            ).fetchone()
+            if row is None:
+                return False
+            for table in ("round_points", "team_seasons", "seasons"):
+                self.connection.execute(f"DELETE FROM {table} WHERE season_id = ?",
+                                        (row["season_id"],))
+            self.__refresh_teams()
+        return True
+
+    def __query(self, sql, parameters=()):
+        return [dict(row) for row in self.connection.execute(sql, parameters)]
+
+    def get_seasons(self, league=None):
+        """
+        :return: list - Dicts with the league, season, size, whether it is
+            finished and champion (the leader, if not finished) of each season.
+        """
+        where = "WHERE league = ?" if league is not None else ""
+        return self.__query(
+            "SELECT league, season, n_rounds, n_teams, finished, champion, champion_points "
+            f"FROM seasons {where} ORDER BY league, season",
+            (league,) if league is not None else ()
+        )
+
+    def get_best_rounds(self, limit=10, team=None, league=None):
+        """
+        :param team: str - Only the rounds of this team (default: every team).
+        :param league: str - Only the rounds of this league (default: every league).
+        :return: list - Dicts with the team, league, season, round and points of
+            the best rounds ever, best first.
+        """
+        conditions, parameters = [], ()
+        if team is not None:
+            conditions.append("r.team = ?")
+            parameters += (team,)
+        if league is not None:
+            conditions.append("s.league = ?")
+            parameters += (league,)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.__query(
+            "SELECT r.team, s.league, s.season, r.round, r.points "
+            f"FROM round_points AS r JOIN seasons AS s USING (season_id) {where} "
+            "ORDER BY r.points DESC LIMIT ?",
+            parameters + (limit,)
+        )
+
+    def get_most_titles(self, limit=10):
+        """
+        :return: list - Dicts with the all-time totals of the teams with most
+            titles (ties broken by total points): league, team, titles, podiums,
+            seasons, finished seasons and total points.
+        """
+        return self.__query(
+            "SELECT league, team, titles, podiums, seasons, finished_seasons, total_points FROM teams "
+            "ORDER BY titles DESC, total_points DESC LIMIT ?", (limit,)
+        )
+
+    def get_longest_streaks(self, limit=10, kind="streak"):
+        """
+        :param kind: str - 'streak' (consecutive rounds scoring at least the round's
+            mean points) or 'lead' (consecutive rounds leading the standings).
+        :return: list - Dicts with the team, league, season and 'length' of the
+            longest streaks of a single season, longest first.
+        """
+        column = STREAK_COLUMNS[kind]
+        return self.__query(
+            f"SELECT t.team, s.league, s.season, t.{column} AS length "
+            f"FROM team_seasons AS t JOIN seasons AS s USING (season_id) "
+            f"ORDER BY t.{column} DESC LIMIT ?", (limit,)
+        )
+
+    def get_team_history(self, team, league=None):
+        """
+        :param league: str - Only the seasons of this league (default: every
+            league with a team of that name).
+        :return: list - Dicts with the aggregates of every season of a team.
+        """
+        where = "AND s.league = ?" if league is not None else ""
+        return self.__query(
+            "SELECT s.league, s.season, s.finished, t.final_position, t.total_points, t.mean_points, "
+            "t.best_round, t.best_round_points, t.worst_round, t.worst_round_points, "
+            "t.longest_streak, t.longest_lead "
+            "FROM team_seasons AS t JOIN seasons AS s USING (season_id) "
+            f"WHERE t.team = ? {where} ORDER BY s.league, s.season",
+            (team,) + ((league,) if league is not None else ())
+        )
@@ -0,0 +1,376 @@
+import os
+import json
+import time
+import argparse
+import threading
+import contextlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+from batch_runner import find_leagues
+from main import compute_stats, generate_league_report
+from instrumentation import profiler
+from stats_calculator import dumps_compact
+
+OFFLINE_AI_MODEL = "offline-stub"
+
+
+class OfflineAIClient:
+    """
+    Stand-in for the OpenAI client (client.chat.completions.create), so the
+    service never leaves localhost. Reports get a fixed answer instead of
+    the AI insights.
+    """
+    def __init__(self):
+        self.chat = self
+        self.completions = self
+
+    def create(self, model, messages, temperature):
+        return _OfflineResponse("Respuesta de la IA no disponible en modo servicio.")
+
+
+class _OfflineResponse:
+    def __init__(self, content):
+        message = type("Message", (), {"content": content})()
+        self.choices = [type("Choice", (), {"message": message})()]
+
+
+class League:
+    """
+    A league known by the service. Its calculator is only kept while the
+    league is in the LeagueCache.
+    """
+    def __init__(self, name, points_csv_path, market_csv_path, output_dir):
+        self.name = name
+        self.points_csv_path = points_csv_path
+        self.market_csv_path = market_csv_path
+        self.output_dir = output_dir
+        self.lock = threading.RLock()
+        self.calculator = None
+        self.stats_json = None
+        self.report_job = None
+
+    def data_version(self):
+        """
+        :return: tuple - Changes whenever the league CSV files change.
+        """
+        version = []
+        for path in (self.points_csv_path, self.market_csv_path):
+            if path is not None:
+                stat = os.stat(path)
+                version.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(version)
+
+
+class LeagueCache:
+    """
+    Least recently used cache of parsed leagues: at most max_leagues
+    calculators are kept in memory. Evicted leagues are loaded again from
+    their CSV snapshot and saved state, which is fast.
+    """
+    def __init__(self, leagues, max_leagues=8):
+        """
+        :param leagues: dict - League objects by name.
+        :param max_leagues: int - Maximum number of leagues kept in memory.
+        """
+        self.leagues = leagues
+        self.max_leagues = max_leagues
+        self.__loaded = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def lock(self, name):
+        """
+        Locks a league with its calculator loaded, marking it as recently used.
+        The calculator is not evicted while the lock is held, so it must be
+        used inside the with block.
+
+        :raises KeyError: If there is no league with that name.
+        """
+        league = self.leagues[name]
+        evicted = []
+        with self.__lock:
+            if name in self.__loaded:
+                self.__loaded.move_to_end(name)
+            else:
+                self.__loaded[name] = league
+                while len(self.__loaded) > self.max_leagues:
+                    evicted.append(self.__loaded.popitem(last=False)[1])
+        # Evicted leagues are released outside the cache lock, once nobody is using them
+        for evicted_league in evicted:
+            with evicted_league.lock:
+                evicted_league.calculator = None
+                evicted_league.stats_json = None
+        with league.lock:
+            if league.calculator is None:
+                league.calculator = compute_stats(league.points_csv_path, league.output_dir)
+            yield league
+
+
+class ReportService:
+    """
+    Keeps leagues warm in memory and answers the HTTP endpoints. Reports are
+    generated by a pool of worker processes: concurrent requests for the
+    same league and data share the same job.
+    """
+    def __init__(self, leagues_dir, output_dir=None, max_leagues=8, workers=2,
+                 include_market_data=False):
+        """
+        :param leagues_dir: str - Directory with one subfolder per league (see batch_runner.find_leagues).
+        :param output_dir: str - Root folder for the generated files. Each league
+            writes into '<output_dir>/<league name>' (default: a 'generated_files'
+            folder inside each league folder).
+        :param max_leagues: int - Maximum number of leagues kept in memory.
+        :param workers: int - Number of report worker processes.
+        :param include_market_data: bool - Include market data when a league has it.
+        """
+        leagues = {}
+        for league in find_leagues(leagues_dir):
+            if output_dir is None:
+                league_output_dir = os.path.join(leagues_dir, league["name"], "generated_files")
+            else:
+                league_output_dir = os.path.join(output_dir, league["name"])
+            leagues[league["name"]] = League(
+                league["name"], league["points_csv_path"],
+                league["market_csv_path"] if include_market_data else None,
+                league_output_dir
+            )
+        self.cache = LeagueCache(leagues, max_leagues)
+        # Nobody reads the stage records of a long-running service, they would only pile up
+        profiler.enabled = False
+        # Spawned, not forked: request threads may hold locks (the cache's, a
+        # league's, the import lock...) that a forked worker would inherit held
+        self.executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_disable_profiler)
+
+    def list_leagues(self):
+        return sorted(self.cache.leagues)
+
+    def get_standings(self, name):
+        with self.cache.lock(name) as league:
+            return self.__standings(name, league.calculator)
+
+    @staticmethod
+    def __standings(name, calculator):
+        standings = calculator.standings[-1].tolist()
+        return {
+            "league": name,
+            "round": int(calculator.rounds[-1]),
+            "standings": [
+                {"position": position, "team": calculator.teams[team_index],
+                 "points": int(calculator.aggregated_points[-1][team_index])}
+                for position, team_index in enumerate(standings, start=1)
+            ]
+        }
+
+    def get_stats_json(self, name):
+        """
+        :return: bytes - The data_dict structure as JSON, serialized once per data change.
+        """
+        with self.cache.lock(name) as league:
+            if league.stats_json is None:
+                league.stats_json = dumps_compact(league.calculator.get_data_dict()).encode("utf-8")
+            return league.stats_json
+
+    def add_rounds(self, name, rounds):
+        """
+        Adds new rounds to a league: they are appended to its points CSV, so
+        later runs see them too, and applied incrementally to the calculator.
+
+        :param rounds: list - Dicts with the 'round' number and the 'points' of every team.
+        :raises ValueError: If a round is not after the last known one, or a team is missing.
+        """
+        with self.cache.lock(name) as league:
+            calculator = league.calculator
+            round_numbers = []
+            round_points = []
+            for round_data in rounds:
+                points = round_data["points"]
+                missing = [team for team in calculator.teams if team not in points]
+                if missing:
+                    raise ValueError(f"Missing points of round {round_data['round']}: {missing[:5]}")
+                round_numbers.append(int(round_data["round"]))
+                round_points.append([int(points[team]) for team in calculator.teams])
+            # Everything is checked before touching the file or the calculator
+            last_round = int(calculator.rounds[-1]) if len(calculator.rounds) else None
+            for round_number in round_numbers:
+                if last_round is not None and round_number <= last_round:
+                    raise ValueError(f"Round {round_number} is not after round {last_round}")
+                last_round = round_number
+
+            # The file first: if it cannot be written, the calculator is left as it was
+            lines = "".join(f"J{round_number};" + ";".join(map(str, points)) + "\n"
+                            for round_number, points in zip(round_numbers, round_points))
+            with open(league.points_csv_path, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                try:
+                    # Files exported without a final newline would glue the first new row
+                    if size and (f.seek(size - 1), f.read(1))[1] != b"\n":
+                        f.write(b"\n")
+                    f.write(lines.encode("utf-8"))
+                    f.flush()
+                    calculator.append_rounds(round_numbers, round_points)
+                except BaseException:
+                    f.truncate(size)
+                    raise
+            calculator.save_state(os.path.join(league.output_dir, "points_stats_state.npz"))
+            league.stats_json = None
+            return self.__standings(name, calculator)
+
+    def request_report(self, name):
+        """
+        Generates the report of a league in the worker pool. If a report of the
+        same data is already being generated, its job is shared. A report of
+        newer data waits for the running one, as both write the same files.
+
+        :return: concurrent.futures.Future - Resolves to the report path.
+        """
+        league = self.cache.leagues[name]
+        with league.lock:
+            version = league.data_version()
+            job = league.report_job
+            if job is not None and job[0] == version:
+                return job[1]
+            result = Future()
+            previous = job[1] if job is not None else None
+
+            def start(_=None):
+                future = self.executor.submit(
+                    generate_league_report,
+                    points_csv_path=league.points_csv_path,
+                    output_dir=league.output_dir,
+                    market_csv_path=league.market_csv_path,
+                    open_ai_api_token="offline",
+                    open_ai_model=OFFLINE_AI_MODEL,
+                    ai_client=OfflineAIClient()
+                )
+                future.add_done_callback(lambda done: _copy_future(done, result))
+
+            if previous is not None and not previous.done():
+                previous.add_done_callback(start)
+            else:
+                start()
+            league.report_job = (version, result)
+            return result
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def _disable_profiler():
+    profiler.enabled = False
+
+
+def _copy_future(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+def make_handler(service):
+    """
+    Builds the HTTP handler of the service:
+    - GET /leagues: league names.
+    - GET /leagues/<name>/standings: current standings.
+    - GET /leagues/<name>/stats: data_dict structure.
+    - POST /leagues/<name>/rounds: adds rounds, body {"round": 7, "points": {"Team": 50, ...}}
+      or a list of them. Returns the new standings.
+    - POST /leagues/<name>/report: generates the PDF report and returns its path.
+    - GET /leagues/<name>/report.pdf: last generated PDF report.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.__dispatch("GET")
+
+        def do_POST(self):
+            self.__dispatch("POST")
+
+        def __dispatch(self, method):
+            parts = [unquote(part) for part in self.path.split("?")[0].strip("/").split("/")]
+            try:
+                if method == "GET" and parts == ["leagues"]:
+                    return self.__send_json({"leagues": service.list_leagues()})
+                if len(parts) != 3 or parts[0] != "leagues":
+                    return self.__send_error(404, "Not found")
+                name, resource = parts[1], parts[2]
+                if name not in service.cache.leagues:
+                    return self.__send_error(404, f"Unknown league: {name}")
+                if method == "GET" and resource == "standings":
+                    return self.__send_json(service.get_standings(name))
+                if method == "GET" and resource == "stats":
+                    return self.__send(200, service.get_stats_json(name), "application/json")
+                if method == "POST" and resource == "rounds":
+                    rounds = self.__read_json()
+                    if isinstance(rounds, dict):
+                        rounds = [rounds]
+                    return self.__send_json(service.add_rounds(name, rounds))
+                if method == "POST" and resource == "report":
+                    start = time.perf_counter()
+                    report_path = service.request_report(name).result()
+                    return self.__send_json({"report_path": report_path,
+                                             "seconds": round(time.perf_counter() - start, 3)})
+                if method == "GET" and resource == "report.pdf":
+                    report_path = os.path.join(service.cache.leagues[name].output_dir,
+                                               "league_report.pdf")
+                    if not os.path.exists(report_path):
+                        return self.__send_error(404, "The report was not generated yet")
+                    with open(report_path, "rb") as f:
+                        return self.__send(200, f.read(), "application/pdf")
+                return self.__send_error(404, "Not found")
+            except (ValueError, KeyError, TypeError) as error:
+                return self.__send_error(400, str(error))
+            except Exception as error:
+                return self.__send_error(500, f"{type(error).__name__}: {error}")
+
+        def __read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+
+        def __send_json(self, data, status=200):
+            self.__send(status, dumps_compact(data).encode("utf-8"), "application/json")
+
+        def __send_error(self, status, message):
+            self.__send_json({"error": message}, status)
+
+        def __send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def serve(service, host="127.0.0.1", port=8000):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"Serving {len(service.cache.leagues)} leagues at http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves league stats and reports over HTTP on localhost.")
+    parser.add_argument("leagues_dir", help="Directory with one subfolder per league")
+    parser.add_argument("--output-dir", default=None,
+                        help="Root folder for the generated files (default: each league folder)")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-leagues", type=int, default=8,
+                        help="Maximum number of leagues kept in memory (default: 8)")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Number of report worker processes (default: 2)")
+    parser.add_argument("--include-market-data", action="store_true")
+    args = parser.parse_args()
+
+    serve(ReportService(args.leagues_dir, output_dir=args.output_dir, max_leagues=args.max_leagues,
+                        workers=args.workers, include_market_data=args.include_market_data),
+          port=args.port)
@@ -0,0 +1,220 @@
+import io
+import os
+import html
+import time
+import base64
+import textwrap
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from instrumentation import profiler
+
+# Output of each report format inside the output folder (the PNG deck is a folder)
+REPORT_FORMATS = {
+    "pdf": "league_report.pdf",
+    "html": "league_report.html",
+    "png": "league_report_slides",
+}
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ margin: 0; background: #eef1f5; font-family: Helvetica, Arial, sans-serif; }}
+.slide {{ max-width: 1100px; margin: 24px auto; padding: 32px; background: white;
+          box-shadow: 0 1px 4px rgba(0, 0, 0, 0.2); text-align: center; }}
+.slide h1 {{ margin: 0 0 16px; }}
+.slide p {{ font-size: 1.2em; line-height: 1.5; }}
+.slide img {{ max-width: 100%; height: auto; }}
+</style>
+</head>
+<body>
+{slides}
+</body>
+</html>
+"""
+
+# PNG deck slides: landscape A4 at 100 dpi, like the PDF pages
+DECK_FIGSIZE = (11.69, 8.27)
+DECK_WRAP_WIDTH = 70
+DECK_LINES_PER_PAGE = 16
+
+
+class TextSlide:
+    """
+    A slide with a text: its first line is the title and the rest the body.
+    """
+    def __init__(self, text):
+        self.text = text
+
+    @property
+    def title(self):
+        return self.text.split("\n", 1)[0]
+
+    @property
+    def body(self):
+        return self.text.split("\n", 1)[1] if "\n" in self.text else ""
+
+
+class ImageSlide:
+    """
+    A slide with a rendered PNG image (e.g. a chart). Every backend uses the
+    same bytes, the chart is never rendered again.
+    """
+    def __init__(self, file_name, data):
+        self.file_name = file_name
+        self.data = data
+
+    def open(self):
+        image = io.BytesIO(self.data)
+        image.name = self.file_name
+        return image
+
+
+def build_slides(*slide_groups, slide_kinds, title="Informe de la Liga"):
+    """
+    Builds the slide model of the report, after a title slide.
+
+    :param slide_groups: Content of each slide group: a (file name, PNG bytes) tuple
+        or None for 'image', a list of texts for 'texts' and a text for 'text'.
+    :param slide_kinds: list - Kind of each slide group.
+    :param title: str - Text of the title slide.
+    :return: list - TextSlide and ImageSlide objects.
+    """
+    slides = [TextSlide(title)]
+    for kind, group in zip(slide_kinds, slide_groups):
+        if kind == "image":
+            if group is not None:
+                slides.append(ImageSlide(*group))
+        elif kind == "texts":
+            slides.extend(TextSlide(text) for text in group)
+        else:
+            slides.append(TextSlide(group))
+    return slides
+
+
+def render_pdf(slides, path):
+    """
+    :return: str - Path to the PDF, one page per slide (long texts take several pages).
+    """
+    from pdf_converter import PDFPresentation
+
+    pdf = PDFPresentation(filename=path)
+    for slide in slides:
+        if isinstance(slide, ImageSlide):
+            pdf.add_image_slide(image_path=slide.open())
+        else:
+            pdf.add_text_slide(text=slide.text)
+    pdf.save()
+    return path
+
+
+def render_html(slides, path):
+    """
+    :return: str - Path to a self-contained HTML page: images are embedded as
+        base64 data, so the file can be shared on its own.
+    """
+    sections = []
+    for slide in slides:
+        if isinstance(slide, ImageSlide):
+            data = base64.b64encode(slide.data).decode("ascii")
+            sections.append(f'<section class="slide"><img src="data:image/png;base64,{data}" '
+                            f'alt="{html.escape(slide.file_name)}"></section>')
+        else:
+            paragraphs = "".join(f"<p>{html.escape(paragraph)}</p>"
+                                 for paragraph in slide.body.split("\n") if paragraph.strip())
+            sections.append(f'<section class="slide"><h1>{html.escape(slide.title)}</h1>'
+                            f'{paragraphs}</section>')
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HTML_TEMPLATE.format(title=html.escape(slides[0].title if slides else ""),
+                                     slides="\n".join(sections)))
+    return path
+
+
+def render_png_deck(slides, path):
+    """
+    Writes one PNG per slide ('slide_01.png', 'slide_02.png'...), e.g. to post
+    them in a chat. Image slides are written as they are; long texts take
+    several images, repeating the title.
+
+    :return: str - Path to the folder with the PNG files.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    os.makedirs(path, exist_ok=True)
+    # Slides of a previous, longer report must not stay in the deck
+    for file_name in os.listdir(path):
+        if file_name.startswith("slide_") and file_name.endswith(".png"):
+            os.remove(os.path.join(path, file_name))
+
+    pages = []
+    for slide in slides:
+        if isinstance(slide, ImageSlide):
+            pages.append(slide.data)
+            continue
+        body_lines = []
+        for paragraph in slide.body.split("\n"):
+            body_lines.extend(textwrap.wrap(paragraph, DECK_WRAP_WIDTH) or [""])
+        title = textwrap.fill(slide.title, DECK_WRAP_WIDTH // 2)
+        for start in range(0, max(len(body_lines), 1), DECK_LINES_PER_PAGE):
+            fig = Figure(figsize=DECK_FIGSIZE)
+            FigureCanvasAgg(fig)
+            page_lines = body_lines[start:start + DECK_LINES_PER_PAGE]
+            fig.text(0.5, 0.6 if page_lines else 0.5, title, ha="center", va="bottom",
+                     fontsize=28, fontweight="bold")
+            if page_lines:
+                fig.text(0.5, 0.55, "\n".join(page_lines), ha="center", va="top", fontsize=16,
+                         linespacing=1.5)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png", dpi=100)
+            pages.append(buffer.getvalue())
+
+    for number, data in enumerate(pages, start=1):
+        with open(os.path.join(path, f"slide_{number:02d}.png"), "wb") as f:
+            f.write(data)
+    return path
+
+
+BACKENDS = {"pdf": render_pdf, "html": render_html, "png": render_png_deck}
+
+
+def _render_backend(report_format, slides, path):
+    # Runs in a worker: renders the whole report in one format and times it
+    start = time.perf_counter()
+    path = BACKENDS[report_format](slides, path)
+    return path, time.perf_counter() - start
+
+
+def export_slides(slides, paths, use_processes=True):
+    """
+    Renders the same slides in several formats at the same time, each backend
+    in its own worker process, so the total time is about the slowest one.
+
+    :param slides: list - Slides built by build_slides().
+    :param paths: dict - Output path of each format ('pdf', 'html' or 'png', see REPORT_FORMATS).
+    :param use_processes: bool - If False (or there is a single format), they are
+        rendered here, one after the other.
+    :return: dict - Path of each rendered format.
+    """
+    unknown = [report_format for report_format in paths if report_format not in BACKENDS]
+    if unknown:
+        raise ValueError(f"Unknown report formats: {unknown}")
+    results = {}
+    if len(paths) == 1 or not use_processes:
+        for report_format, path in paths.items():
+            with profiler.stage(f"report.{report_format}"):
+                results[report_format] = BACKENDS[report_format](slides, path)
+        return results
+    # Spawned, not forked: this runs in a pipeline worker thread, and a forked
+    # child could inherit a lock (e.g. the profiler's) held by another stage
+    with ProcessPoolExecutor(max_workers=len(paths),
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {report_format: executor.submit(_render_backend, report_format, slides, path)
+                   for report_format, path in paths.items()}
+        for report_format, future in futures.items():
+            results[report_format], seconds = future.result()
+            # The worker's own records stay in its process
+            profiler.record(f"report.{report_format}", seconds)
+    return results
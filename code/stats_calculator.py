@@ -1,16 +1,354 @@
 import os
-import pandas as pd
 import json
+import shutil
+import weakref
+import zipfile
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from data_loader import parse_round_labels
+from instrumentation import profiler
+from market_analytics import get_moves_matrix
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Matrix cells processed at once by the chunked (big league) code paths
+DEFAULT_CHUNK_CELLS = 1 << 20
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def dumps_compact(data):
+    """
+    Serializes data as minified JSON, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+def dumps_in_budget(data, max_tokens=None, table_key=None):
+    """
+    Serializes a columnar summary as minified JSON that fits in a token budget
+    (see PointsStatsCalculator.estimate_tokens). Every list of its table has
+    one value per team, sorted by the standings: when it does not fit, only
+    the first and the last teams are kept, as many as fit, and the table gets
+    the number of 'omitted_teams'.
+
+    :param data: dict - Summary (e.g. FormAnalytics.get_summary()).
+    :param max_tokens: int - Approximate token budget. If None, no limit.
+    :param table_key: str - Key of the table in data. If None, data is the table.
+    :return: str - JSON string (if not even one team of each end fits, none of them).
+    """
+    def serialize(n_side=None):
+        if n_side is None:
+            trimmed = data
+        else:
+            table = data if table_key is None else data[table_key]
+            trimmed_table = dict(table, omitted_teams=n_teams - 2 * n_side)
+            for key in columns:
+                trimmed_table[key] = table[key][:n_side] + table[key][n_teams - n_side:]
+            trimmed = trimmed_table if table_key is None else dict(data, **{table_key: trimmed_table})
+        return json.dumps(trimmed, ensure_ascii=False, separators=(",", ":"))
+
+    text = serialize()
+    if max_tokens is None or PointsStatsCalculator.estimate_tokens(text) <= max_tokens:
+        return text
+    table = data if table_key is None else data[table_key]
+    columns = [key for key, values in table.items() if isinstance(values, list)]
+    n_teams = len(table[columns[0]]) if columns else 0
+    # Binary search of the largest number of teams of each end that fits
+    low, high, best = 1, (n_teams - 1) // 2, None
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = serialize(middle)
+        if PointsStatsCalculator.estimate_tokens(candidate) <= max_tokens:
+            best, low = candidate, middle + 1
+        else:
+            high = middle - 1
+    return best if best is not None else serialize(0)
+
+
+def split_points_dataframe(dataframe):
+    """
+    Splits a points DataFrame ('Jornada' column plus one column per team)
+    into its round numbers, team names and round x team points matrix.
+    A (rounds, teams, round_points) tuple, as returned by
+    data_loader.load_points(), is returned as it is.
+
+    :param dataframe: pd.DataFrame or tuple - Points data.
+    :return: tuple - (rounds, teams, round_points).
+    """
+    if not isinstance(dataframe, pd.DataFrame):
+        rounds, teams, round_points = dataframe
+        return (np.asarray(rounds, dtype=np.int64), list(teams),
+                np.asarray(round_points, dtype=np.int64))
+    teams = list(dataframe.columns[1:])
+    return (parse_round_labels(dataframe['Jornada']), teams,
+            dataframe[teams].to_numpy(dtype=np.int64))
+
+
+def summarize_bands(rounds, teams, values, highlighted, percentiles=DEFAULT_PERCENTILES,
+                    chunk_cells=DEFAULT_CHUNK_CELLS):
+    """
+    Summarizes a round x team matrix for a chart of a league too big to draw
+    one line per team: the given percentiles of all teams in each round,
+    plus the full series of a few highlighted teams. Rows are processed in
+    chunks, so the memory does not grow with the number of teams.
+
+    :param rounds: array-like - Round number of each row.
+    :param teams: list - Team name of each column.
+    :param values: np.ndarray - Round x team matrix (may be memory-mapped).
+    :param highlighted: array-like - Column indices of the highlighted teams.
+    :param percentiles: tuple - Percentiles of the bands (empty for no bands).
+    :return: dict - {"rounds": [...], "percentiles": {"10": [...], ...},
+        "teams": {team: [...]}}, with one value per round in every list.
+    """
+    n_rounds, n_teams = values.shape
+    chunk_rows = max(chunk_cells // max(n_teams, 1), 1)
+    bands = np.empty((len(percentiles), n_rounds))
+    if percentiles:
+        for start in range(0, n_rounds, chunk_rows):
+            rows = slice(start, start + chunk_rows)
+            bands[:, rows] = np.percentile(np.asarray(values[rows]), percentiles, axis=1)
+    highlighted = np.asarray(highlighted, dtype=np.int64)
+    highlighted_values = np.asarray(values[:, highlighted])
+    return {
+        "rounds": np.asarray(rounds).tolist(),
+        "percentiles": {str(percentile): band.tolist()
+                        for percentile, band in zip(percentiles, bands)},
+        "teams": {teams[team_index]: highlighted_values[:, column].tolist()
+                  for column, team_index in enumerate(highlighted.tolist())},
+    }
+
+
+def get_default_output_dir():
+    return os.path.join(
+        os.getenv('BASE_DIR'),
+        'generated_files'
+    )
+
+
+def get_default_state_path():
+    return os.path.join(get_default_output_dir(), 'points_stats_state.npz')
+
 
 class PointsStatsCalculator:
 
     def __init__(self, dataframe):
-        self.data_dict = self.__transform_round_points_to_json(dataframe)
+        rounds, teams, round_points = split_points_dataframe(dataframe)
+        self.__load_matrix(rounds, teams, round_points)
 
-    def __transform_round_points_to_json(self, dataframe):
+    @classmethod
+    def from_matrix(cls, rounds, teams, round_points, memmap_dir=None,
+                    chunk_cells=DEFAULT_CHUNK_CELLS):
         """
-        Transforms a DataFrame with the structure of points for each team
-        per round into a dictionary with the following structure:
+        Builds a calculator straight from a round x team matrix of points,
+        skipping the DataFrame parsing.
+
+        :param rounds: array-like - Round number of each row.
+        :param teams: list - Team name of each column.
+        :param round_points: array-like - Points per round (rows) and team (columns).
+            It may be a memory-mapped array.
+        :param memmap_dir: str - Big league mode: if given, the matrices are
+            computed in chunks of chunk_cells and stored as memory-mapped .npy
+            files in a subfolder of this one, instead of in memory. Every
+            calculator has its own subfolder, removed when it is garbage collected.
+        :param chunk_cells: int - Matrix cells per chunk in big league mode.
+        :return: PointsStatsCalculator
+        """
+        calculator = cls.__new__(cls)
+        if memmap_dir is None:
+            round_points = np.asarray(round_points, dtype=np.int64)
+        calculator.__load_matrix(np.asarray(rounds, dtype=np.int64), list(teams),
+                                 round_points, memmap_dir, chunk_cells)
+        return calculator
+
+    @profiler.timed("stats.transform")
+    def __load_matrix(self, rounds, teams, round_points, memmap_dir=None,
+                      chunk_cells=DEFAULT_CHUNK_CELLS):
+        """
+        Computes the round x team matrices every stat is derived from:
+        - rounds: round numbers, sorted ascending.
+        - round_points: points of each team in each round.
+        - aggregated_points: cumulative points of each team up to each round.
+        - positions: position of each team in each round (1 is the leader).
+        Rows are sorted by round number, so the input may be out of order.
+        Ties in aggregated points keep the original column order.
+        """
+        order = np.argsort(rounds, kind="stable")
+        self.rounds = rounds[order]
+        self.teams = teams
+        self.chunk_cells = chunk_cells
+        if memmap_dir is None:
+            self.round_points = round_points[order]
+            self.aggregated_points = np.cumsum(self.round_points, axis=0)
+            self.standings, self.positions = self.__rank(self.aggregated_points)
+        else:
+            self.__load_matrix_chunked(round_points, order, memmap_dir, chunk_cells)
+        self.__data_dict = None
+        self.__extremes_index = None
+
+    def __load_matrix_chunked(self, round_points, order, memmap_dir, chunk_cells):
+        n_rounds, n_teams = round_points.shape
+        # Files of their own: rewriting the ones of another calculator would change
+        # its data underneath it (or crash it with SIGBUS while they are truncated)
+        os.makedirs(memmap_dir, exist_ok=True)
+        matrices_dir = tempfile.mkdtemp(prefix="matrices-", dir=memmap_dir)
+        weakref.finalize(self, shutil.rmtree, matrices_dir, ignore_errors=True)
+        matrices = {}
+        for name in ("round_points", "aggregated_points", "standings", "positions"):
+            matrices[name] = np.lib.format.open_memmap(
+                os.path.join(matrices_dir, f"{name}.npy"), mode="w+",
+                dtype=np.int64, shape=(n_rounds, n_teams)
+            )
+        # Cumulative sums only need each team's column: process column chunks
+        chunk_columns = max(chunk_cells // max(n_rounds, 1), 1)
+        for start in range(0, n_teams, chunk_columns):
+            columns = slice(start, start + chunk_columns)
+            points = np.asarray(round_points[:, columns], dtype=np.int64)[order]
+            matrices["round_points"][:, columns] = points
+            matrices["aggregated_points"][:, columns] = np.cumsum(points, axis=0)
+        # Ranking needs every team of a round: process row chunks
+        chunk_rows = max(chunk_cells // max(n_teams, 1), 1)
+        for start in range(0, n_rounds, chunk_rows):
+            rows = slice(start, start + chunk_rows)
+            matrices["standings"][rows], matrices["positions"][rows] = self.__rank(
+                np.asarray(matrices["aggregated_points"][rows])
+            )
+        for name, matrix in matrices.items():
+            matrix.flush()
+            setattr(self, name, matrix)
+
+    @staticmethod
+    def __rank(aggregated_points):
+        # standings[r] holds the team indices of round r sorted by position
+        standings = np.argsort(-aggregated_points, axis=1, kind="stable")
+        positions = np.empty_like(standings)
+        np.put_along_axis(positions, standings,
+                          np.arange(1, aggregated_points.shape[1] + 1)[np.newaxis, :], axis=1)
+        return standings, positions
+
+    @profiler.timed("stats.append_rounds")
+    def append_rounds(self, rounds, round_points):
+        """
+        Adds rounds played after the last known one, reusing the cumulative
+        totals of the last round instead of recomputing the whole season.
+        The cost is O(teams) per new round. Memory-mapped matrices (big
+        league mode) are loaded in memory.
+
+        :param rounds: array-like - Round number of each new row.
+        :param round_points: array-like - Points per new round (rows) and team (columns).
+        """
+        rounds = np.asarray(rounds, dtype=np.int64)
+        if len(rounds) == 0:
+            return
+        round_points = np.asarray(round_points, dtype=np.int64).reshape(len(rounds), len(self.teams))
+        order = np.argsort(rounds, kind="stable")
+        rounds, round_points = rounds[order], round_points[order]
+        if len(self.rounds) and rounds[0] <= self.rounds[-1]:
+            raise ValueError(
+                f"Round {rounds[0]} is not after the last known round {self.rounds[-1]}."
+            )
+        last_aggregated = (self.aggregated_points[-1] if len(self.rounds)
+                           else np.zeros(len(self.teams), dtype=np.int64))
+        aggregated_points = last_aggregated + np.cumsum(round_points, axis=0)
+        standings, positions = self.__rank(aggregated_points)
+        self.rounds = np.concatenate([self.rounds, rounds])
+        self.round_points = np.concatenate([self.round_points, round_points])
+        self.aggregated_points = np.concatenate([self.aggregated_points, aggregated_points])
+        self.standings = np.concatenate([self.standings, standings])
+        self.positions = np.concatenate([self.positions, positions])
+        self.__data_dict = None
+        self.__extremes_index = None
+
+    def save_state(self, state_path=None):
+        """
+        Saves the round x team matrices to a sidecar file, so the next run
+        can continue from them with from_state().
+
+        :param state_path: str - Path of the .npz state file
+            (default: generated_files/points_stats_state.npz).
+        """
+        if state_path is None:
+            state_path = get_default_state_path()
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+        # Written aside and then renamed, so readers (e.g. report workers) never see half a file
+        tmp_path = f"{state_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                rounds=self.rounds,
+                teams=np.asarray(self.teams, dtype=str),
+                round_points=self.round_points,
+                aggregated_points=self.aggregated_points,
+                standings=self.standings,
+                positions=self.positions
+            )
+        os.replace(tmp_path, state_path)
+
+    @classmethod
+    def from_state(cls, dataframe, state_path=None):
+        """
+        Builds a calculator for the given points DataFrame, reusing the state
+        saved by the previous run. When the DataFrame only adds new rounds
+        after the saved ones, just those rounds are computed. If the teams
+        changed, or any saved round was edited or removed, it falls back to
+        a full rebuild.
+
+        :param dataframe: pd.DataFrame - DataFrame structured as needed, or the
+            (rounds, teams, round_points) tuple returned by data_loader.load_points().
+        :param state_path: str - Path of the .npz state file
+            (default: generated_files/points_stats_state.npz).
+        :return: PointsStatsCalculator
+        """
+        if state_path is None:
+            state_path = get_default_state_path()
+        calculator = cls.__load_state(state_path)
+        if calculator is None:
+            return cls(dataframe)
+        rounds, teams, round_points = split_points_dataframe(dataframe)
+        if teams != calculator.teams:
+            return cls(dataframe)
+        is_known = np.isin(rounds, calculator.rounds)
+        if is_known.sum() != len(calculator.rounds):
+            return cls(dataframe)
+        known_rows = np.searchsorted(calculator.rounds, rounds[is_known])
+        if not np.array_equal(calculator.round_points[known_rows], round_points[is_known]):
+            return cls(dataframe)
+        try:
+            calculator.append_rounds(rounds[~is_known], round_points[~is_known])
+        except ValueError:
+            # A new round was inserted between the saved ones
+            return cls(dataframe)
+        return calculator
+
+    @classmethod
+    def __load_state(cls, state_path):
+        if not os.path.exists(state_path):
+            return None
+        calculator = cls.__new__(cls)
+        try:
+            with np.load(state_path, allow_pickle=False) as state:
+                calculator.rounds = state["rounds"]
+                calculator.teams = state["teams"].tolist()
+                calculator.round_points = state["round_points"]
+                calculator.aggregated_points = state["aggregated_points"]
+                calculator.standings = state["standings"]
+                calculator.positions = state["positions"]
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # Unreadable (e.g. truncated) state, the caller will do a full rebuild
+            return None
+        calculator.chunk_cells = DEFAULT_CHUNK_CELLS
+        calculator.__data_dict = None
+        calculator.__extremes_index = None
+        return calculator
+
+    def __transform_round_points_to_json(self):
+        """
+        Transforms the round x team matrices into a dictionary with the following structure:
         [
             {
                 "round": 1,
@@ -25,115 +363,216 @@ class PointsStatsCalculator:
             }
             ...
         ]
+        Each round's data is sorted by position.
 
-        :param dataframe: pd.DataFrame - DataFrame structured as needed.
         :return: list - A JSON-like dictionary matching the previous structure.
         """
-        # Create a list to store the final JSON structure
-        result = []
-
-        # Iterate over the rows of the DataFrame
-        for index, row in dataframe.iterrows():
-            # Extract the round by removing the leading 'J' from the Jornada value
-            round_number = int(row['Jornada'][1:])
+        return list(self.__iter_round_dicts())
 
-            # Initialize a list to hold team data for the current round
+    def __iter_round_dicts(self):
+        # Yields the rounds of the data_dict structure one by one
+        for row, round_number in enumerate(self.rounds.tolist()):
+            standings = np.asarray(self.standings[row])
+            round_points = np.asarray(self.round_points[row])[standings].tolist()
+            aggregated_points = np.asarray(self.aggregated_points[row])[standings].tolist()
             round_data = []
-            
-            # Iterate through each team column to gather points and calculate aggregated points
-            for team in dataframe.columns[1:]:
-                round_points = row[team]
-                
-                # Calculate the aggregated points by summing the rows for the current team up to this round
-                aggregated_points = dataframe.loc[:index, team].sum()
-
-                # Add the team data to the round's list
+            for position, team_index in enumerate(standings.tolist(), start=1):
                 round_data.append({
-                    "team": team,
-                    "round_points": int(round_points),
-                    "aggregated_points": int(aggregated_points),
-                    "position": None  # Placeholder for now, can be calculated if needed
+                    "team": self.teams[team_index],
+                    "round_points": round_points[position - 1],
+                    "aggregated_points": aggregated_points[position - 1],
+                    "position": position
                 })
+            yield {
+                "round": round_number,
+                "data": round_data
+            }
 
-            # Calculate positions based on aggregated points for this round
-            # Sorting in descending order of aggregated points
-            round_data = sorted(round_data, key=lambda x: x["aggregated_points"], reverse=True)
+    def export_json(self, json_file_path=None, json_format="json", background=False):
+        """
+        Exports the data_dict structure, streaming it round by round instead of
+        building it in memory first. orjson is used when it is installed.
 
-            # Assign positions based on sorted order
-            for position, team_data in enumerate(round_data, start=1):
-                team_data["position"] = position
+        :param json_file_path: str - Path of the exported file
+            (default: generated_files/points_stats.json, or .jsonl for JSON Lines).
+        :param json_format: str - 'json' for a minified JSON list, or 'jsonl'
+            for JSON Lines with one round per line.
+        :param background: bool - If True, the file is written in a background
+            thread, which is returned so the caller can join() it.
+        :return: str or threading.Thread - Path of the exported file, or the
+            thread writing it.
+        """
+        if json_format not in ("json", "jsonl"):
+            raise ValueError(f"Unknown JSON export format: {json_format}")
+        if json_file_path is None:
+            json_file_path = os.path.join(
+                get_default_output_dir(),
+                f'points_stats.{json_format}'
+            )
+        if background:
+            thread = threading.Thread(target=self.__write_json,
+                                      args=(json_file_path, json_format), daemon=True)
+            thread.start()
+            return thread
+        self.__write_json(json_file_path, json_format)
+        return json_file_path
 
-            # Append the round's data to the result list
-            result.append({
-                "round": round_number,
-                "data": round_data
-            })
-        # Save the result as a JSON file
-        json_folder_path = os.path.join(
-            os.getenv('BASE_DIR'),
-            'generated_files'
-        )
-        json_file_path = os.path.join(
-            json_folder_path,
-            'points_stats.json'
-        )
-        os.makedirs(json_folder_path, exist_ok=True)
+    @profiler.timed("stats.export_json")
+    def __write_json(self, json_file_path, json_format):
+        os.makedirs(os.path.dirname(json_file_path) or ".", exist_ok=True)
+        separator, prefix, suffix = ("\n", "", "\n") if json_format == "jsonl" else (",", "[", "]")
         with open(json_file_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=4)
-        result = sorted(result, key=lambda x: x["round"])
-        return result
+            f.write(prefix)
+            for index, round_dict in enumerate(self.__iter_round_dicts()):
+                if index:
+                    f.write(separator)
+                f.write(dumps_compact(round_dict))
+            f.write(suffix)
+
+    @property
+    def data_dict(self):
+        return self.get_data_dict()
+
+    def iter_data_dict(self):
+        """
+        Yields the rounds of the data_dict structure one by one, without
+        building the whole list (see get_data_dict()).
+        """
+        return self.__iter_round_dicts()
+
+    def __long_format_data(self, value_column, values, rows=slice(None)):
+        # One record per round and team, ordered by round and then by position
+        n_teams = values.shape[1]
+        teams = np.asarray(self.teams, dtype=object)
+        standings = np.asarray(self.standings[rows])
+        return pd.DataFrame({
+            "round": np.repeat(self.rounds[rows], n_teams),
+            "player": teams[standings].ravel(),
+            value_column: np.take_along_axis(np.asarray(values[rows]), standings, axis=1).ravel()
+        }, columns=["round", "player", value_column])
+
+    def __iter_long_format_data(self, value_column, values, chunk_rows):
+        if chunk_rows is None:
+            chunk_rows = max(self.chunk_cells // max(len(self.teams), 1), 1)
+        for start in range(0, len(self.rounds), chunk_rows):
+            yield self.__long_format_data(value_column, values, slice(start, start + chunk_rows))
 
     def get_position_data(self):
-        records = []
-        for round_info in self.data_dict:
-            round_number = round_info["round"]
-            for team_data in round_info["data"]:
-                records.append({
-                    "round": round_number,
-                    "player": team_data["team"],
-                    "position": team_data["position"]
-                })
-        return pd.DataFrame(records, columns=["round", "player", "position"])
-    
+        return self.__long_format_data("position", self.positions)
+
     def get_points_data(self):
-        records = []
-        for round_info in self.data_dict:
-            round_number = round_info["round"]
-            for team_data in round_info["data"]:
-                records.append({
-                    "round": round_number,
-                    "player": team_data["team"],
-                    "aggregated_points": team_data["aggregated_points"]
-                })
-        return pd.DataFrame(records, columns=["round", "player", "aggregated_points"])
-    
+        return self.__long_format_data("aggregated_points", self.aggregated_points)
+
+    def iter_position_data(self, chunk_rows=None):
+        """
+        Yields get_position_data() in DataFrames of chunk_rows rounds, so
+        big leagues never hold every record in memory at once.
+
+        :param chunk_rows: int - Rounds per DataFrame (default: as many as fit in chunk_cells).
+        """
+        return self.__iter_long_format_data("position", self.positions, chunk_rows)
+
+    def iter_points_data(self, chunk_rows=None):
+        """
+        Yields get_points_data() in DataFrames of chunk_rows rounds (see iter_position_data()).
+        """
+        return self.__iter_long_format_data("aggregated_points", self.aggregated_points, chunk_rows)
+
+    def get_band_data(self, value_column, n_highlight=5, percentiles=DEFAULT_PERCENTILES):
+        """
+        Summarizes the positions or the aggregated points for
+        Graficator.plot_bands: the percentile bands of all teams, plus the
+        first and last n_highlight teams of the current standings.
+
+        :param value_column: str - 'position' or 'aggregated_points'.
+        :return: dict - See summarize_bands().
+        """
+        values = {"position": self.positions, "aggregated_points": self.aggregated_points}[value_column]
+        return summarize_bands(self.rounds, self.teams, values,
+                               self.get_highlighted_teams(n_highlight), percentiles, self.chunk_cells)
+
+    def get_highlighted_teams(self, n_highlight=5):
+        """
+        :return: np.ndarray - Column indices of the first and the last
+            n_highlight teams of the current standings.
+        """
+        standings = np.asarray(self.standings[-1])
+        if len(standings) <= 2 * n_highlight:
+            return standings
+        return np.concatenate([standings[:n_highlight], standings[len(standings) - n_highlight:]])
+
+    def get_best_worst_rounds_index(self):
+        """
+        Computes the best and worst round of every team, and the overall ones,
+        in a single pass over the round x team matrix. Ties go to the earliest
+        round and, in the overall extremes, to the best positioned team.
+        The result is built once and reused until new rounds are added:
+        {
+            "teams": {
+                "Test Team": {
+                    "best": {"player": "Test Team", "round_number": 3, "points": 90, "ties": [3, 7]},
+                    "worst": {"player": "Test Team", "round_number": 1, "points": 20, "ties": [1]}
+                }
+                ...
+            },
+            "overall": {
+                "best": {"player": "Test Team", "round_number": 3, "points": 90,
+                         "ties": [{"player": "Test Team", "round_number": 3}]},
+                "worst": {...}
+            }
+        }
+
+        :return: dict - Index matching the previous structure.
+        """
+        if self.__extremes_index is not None:
+            return self.__extremes_index
+        index = {"teams": {}, "overall": {"best": None, "worst": None}}
+        if len(self.rounds):
+            rounds = self.rounds.tolist()
+            # Each team only needs its own column: process column chunks
+            chunk_columns = max(self.chunk_cells // len(rounds), 1)
+            column_chunks = [slice(start, start + chunk_columns)
+                             for start in range(0, len(self.teams), chunk_columns)]
+            for extreme, reduce in (("best", np.max), ("worst", np.min)):
+                extreme_points = np.empty(len(self.teams), dtype=np.int64)
+                for columns in column_chunks:
+                    round_points = np.asarray(self.round_points[:, columns])
+                    extreme_points[columns] = reduce(round_points, axis=0)
+                    is_extreme = round_points == extreme_points[columns]
+                    first_rows = np.argmax(is_extreme, axis=0)
+                    for column, team in enumerate(self.teams[columns]):
+                        index["teams"].setdefault(team, {})[extreme] = {
+                            "player": team,
+                            "round_number": rounds[first_rows[column]],
+                            "points": int(extreme_points[columns.start + column]),
+                            "ties": self.rounds[is_extreme[:, column]].tolist()
+                        }
+                overall_points = reduce(extreme_points)
+                rows, team_indices = [], []
+                for columns in column_chunks:
+                    chunk_rows, chunk_columns = np.nonzero(
+                        np.asarray(self.round_points[:, columns]) == overall_points)
+                    rows.append(chunk_rows)
+                    team_indices.append(chunk_columns + columns.start)
+                rows, team_indices = np.concatenate(rows), np.concatenate(team_indices)
+                # Earliest round first, then the best positioned team in that round
+                order = np.lexsort((np.asarray(self.positions[rows, team_indices]), rows))
+                ties = [{"player": self.teams[team_indices[i]], "round_number": rounds[rows[i]]}
+                        for i in order.tolist()]
+                index["overall"][extreme] = dict(ties[0], points=int(overall_points), ties=ties)
+        self.__extremes_index = index
+        return index
+
     def get_best_worst_round(self, player=None):
-        best = {"player": None, "round_number": None, "points": float('-inf')}
-        worst = {"player": None, "round_number": None, "points": float('inf')}
-
-        for round_info in self.data_dict:
-            round_number = round_info["round"]
-            for team_data in round_info["data"]:
-                if player is not None and team_data["team"] != player:
-                    continue
-                points = team_data["round_points"]
-                if points > best["points"]:
-                    best = {
-                        "player": team_data["team"],
-                        "round_number": round_number,
-                        "points": points
-                    }
-                if points < worst["points"]:
-                    worst = {
-                        "player": team_data["team"],
-                        "round_number": round_number,
-                        "points": points
-                    }
+        index = self.get_best_worst_rounds_index()
+        if player is None:
+            return index["overall"]["best"], index["overall"]["worst"]
         # If player is specified but not found, return None for both
-        if player is not None and (best["player"] is None or worst["player"] is None):
+        team_index = index["teams"].get(player)
+        if team_index is None:
             return None, None
-        return best, worst
-    
+        return team_index["best"], team_index["worst"]
+
     def get_verbose_best_worst_round(self, player = None, 
             best = None, worst = None, is_overall = False):
         if best is None or worst is None:
@@ -156,19 +595,185 @@ class PointsStatsCalculator:
         text += f"Puntos conseguidos: {worst.get('points')}\n"
         return text
 
+    def archive_season(self, archive, league, season, finished=False):
+        """
+        Stores this season in a SeasonArchive, for the all-time records.
+
+        :param archive: SeasonArchive - Archive of past seasons (see season_archive).
+        :param league: str - League name.
+        :param season: str - Season name (e.g. '2025-26').
+        :param finished: bool - Whether the season is over (only then its
+            leader counts as a title).
+        :return: bool - True if the archive changed.
+        """
+        return archive.ingest(self, league, season, finished=finished)
+
+    @staticmethod
+    def get_best_rounds_ever(archive, limit=10, team=None):
+        """
+        :return: list - Best rounds of all the archived seasons (of a single team, if given).
+        """
+        return archive.get_best_rounds(limit=limit, team=team)
+
+    @staticmethod
+    def get_most_titles(archive, limit=10):
+        """
+        :return: list - Teams (of each league) with most titles in all the
+            finished archived seasons.
+        """
+        return archive.get_most_titles(limit=limit)
+
+    @staticmethod
+    def get_longest_streaks(archive, limit=10, kind="streak"):
+        """
+        :param kind: str - 'streak' (rounds scoring at least the round's mean
+            points) or 'lead' (rounds leading the standings).
+        :return: list - Longest streaks of all the archived seasons.
+        """
+        return archive.get_longest_streaks(limit=limit, kind=kind)
+
+    @staticmethod
+    def get_verbose_all_time_records(archive, limit=3):
+        """
+        :return: str - All-time records of the archived seasons, as a text.
+        """
+        text = f"Récords históricos ({len(archive.get_seasons())} temporadas):\n"
+        text += "\nMejores jornadas:\n"
+        for record in archive.get_best_rounds(limit=limit):
+            text += (f"{record['team']}: {record['points']} puntos en la jornada "
+                     f"{record['round']} ({record['league']} {record['season']})\n")
+        text += "\nMás títulos:\n"
+        for record in archive.get_most_titles(limit=limit):
+            if not record['titles']:
+                break
+            text += (f"{record['team']} ({record['league']}): {record['titles']} de "
+                     f"{record['finished_seasons']} temporadas terminadas\n")
+        text += "\nRachas más largas por encima de la media:\n"
+        for record in archive.get_longest_streaks(limit=limit):
+            text += (f"{record['team']}: {record['length']} jornadas "
+                     f"({record['league']} {record['season']})\n")
+        text += "\nMás jornadas seguidas como líder:\n"
+        for record in archive.get_longest_streaks(limit=limit, kind="lead"):
+            if not record['length']:
+                break
+            text += (f"{record['team']}: {record['length']} jornadas "
+                     f"({record['league']} {record['season']})\n")
+        return text
+
     def get_data_dict(self):
-        return self.data_dict
+        # The list of dicts is only built the first time somebody asks for it
+        if self.__data_dict is None:
+            self.__data_dict = self.__transform_round_points_to_json()
+        return self.__data_dict
 
-    def get_market_movements_dict(self, market_df):
+    def get_compact_data(self, last_n_rounds=None, include_matrix=True):
         """
-        Given a DataFrame structured as needed with market data,
+        Returns the stats in a compact, columnar form, meant to be sent to an
+        AI model without repeating the same keys for every team and round:
+        {
+            "teams": ["Team A", "Team B"],  # only with include_matrix
+            "rounds": [5, 6],  # only with include_matrix
+            "round_points": [[50, 40], [33, 61]],  # only with include_matrix, one row per round
+            "standings": {
+                "team": ["Team B", "Team A"],  # sorted by current position
+                "aggregated_points": [300, 290],
+                "position_change": [1, -1],  # positions gained in the last rounds
+                "recent_mean": [50.5, 41.5]  # mean round points in the last rounds
+            }
+        }
+
+        :param last_n_rounds: int - Number of last rounds included in the
+            round matrix and used for the trends. If None, all rounds.
+        :param include_matrix: bool - If False, only the standings are included.
+        :return: dict - Compact stats structure.
+        """
+        n_rounds = len(self.rounds)
+        if last_n_rounds is None or last_n_rounds > n_rounds:
+            last_n_rounds = n_rounds
+        last_n_rounds = max(last_n_rounds, 0)
+        window = slice(n_rounds - last_n_rounds, n_rounds)
+        result = {}
+        if include_matrix:
+            result["teams"] = self.teams
+            result["rounds"] = self.rounds[window].tolist()
+            result["round_points"] = self.round_points[window].tolist()
+        if n_rounds:
+            standings = self.standings[-1]
+            # Position before the first round of the window (last place before round 1)
+            first_row = n_rounds - max(last_n_rounds, 1)
+            previous_positions = (self.positions[first_row - 1] if first_row > 0
+                                  else np.full(len(self.teams), len(self.teams)))
+            recent_points = self.round_points[max(first_row, 0):]
+            result["standings"] = {
+                "team": [self.teams[team_index] for team_index in standings.tolist()],
+                "aggregated_points": self.aggregated_points[-1][standings].tolist(),
+                "position_change": (previous_positions - self.positions[-1])[standings].tolist(),
+                "recent_mean": np.round(recent_points.mean(axis=0), 1)[standings].tolist()
+            }
+        return result
+
+    def get_prompt_data(self, max_tokens=None, last_n_rounds=None, include_matrix=True):
+        """
+        Serializes get_compact_data() as minified JSON that fits in a token
+        budget. When it does not fit, the oldest rounds are dropped from the
+        round matrix and, as a last resort, only the standings are kept, trimmed
+        to their first and last teams if needed (see dumps_in_budget()).
+
+        :param max_tokens: int - Approximate token budget. If None, no limit.
+        :param last_n_rounds: int - Maximum number of last rounds to include.
+        :param include_matrix: bool - If False, only the standings are included.
+        :return: str - JSON string.
+        """
+        def serialize(n_rounds, with_matrix=include_matrix):
+            return json.dumps(
+                self.get_compact_data(n_rounds, include_matrix=with_matrix),
+                ensure_ascii=False, separators=(",", ":")
+            )
+
+        max_rounds = len(self.rounds) if last_n_rounds is None else min(last_n_rounds, len(self.rounds))
+        if max_tokens is None:
+            return serialize(max_rounds)
+        fit_rounds = max_rounds
+        if include_matrix:
+            # Each cell takes at least a digit and a comma: matrices that cannot
+            # fit are never built (in big leagues, not even a single round fits)
+            names_length = sum(len(team) + 3 for team in self.teams)
+            cells_budget = (3 * max_tokens - names_length) // (2 * max(len(self.teams), 1) + 1)
+            fit_rounds = min(max_rounds, max(cells_budget, 0))
+        if fit_rounds == max_rounds:
+            text = serialize(max_rounds)
+            if self.estimate_tokens(text) <= max_tokens:
+                return text
+            fit_rounds -= 1
+        if include_matrix:
+            # Binary search of the largest number of rounds that fits
+            low, high, best = 1, fit_rounds, None
+            while low <= high:
+                middle = (low + high) // 2
+                candidate = serialize(middle)
+                if self.estimate_tokens(candidate) <= max_tokens:
+                    best, low = candidate, middle + 1
+                else:
+                    high = middle - 1
+            if best is not None:
+                return best
+        return dumps_in_budget(self.get_compact_data(max_rounds, include_matrix=False),
+                               max_tokens, table_key="standings")
+
+    @staticmethod
+    def estimate_tokens(text):
+        # Rough estimate for JSON full of numbers and short names
+        return len(text) // 3 + 1
+
+    @staticmethod
+    def get_market_movements_dict(market_df):
+        """
+        Given a DataFrame structured as needed with market data (or the
+        (months, teams, moves) tuple returned by data_loader.load_market()),
         returns a dictionary mapping team names to their total market movements.
         """
-        # Skip the first column (Mes), sum the rest per column
-        team_columns = market_df.columns[1:]
-        movements = {}
-        for team in team_columns:
-            # Convert to numeric in case of string values
-            total = pd.to_numeric(market_df[team], errors='coerce').sum()
-            movements[team] = int(total)
-        return movements
+        if isinstance(market_df, pd.DataFrame):
+            teams, moves = get_moves_matrix(market_df)
+        else:
+            _, teams, moves = market_df
+        return dict(zip(teams, np.asarray(moves).sum(axis=0).tolist()))
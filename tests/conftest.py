@@ -0,0 +1,48 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The modules live in code/ and import each other by their plain names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code"))
+
+TEAMS = ["Team Thunder", "The Stars", "Just My Team", "Another Team", "Team Example"]
+
+
+def write_points_csv(path, n_rounds, seed=0, teams=TEAMS):
+    """
+    Writes a points CSV with rounds J1 to J<n_rounds>. The points of a round
+    only depend on the seed and the round, so a longer file of the same seed
+    only adds rounds.
+    """
+    lines = [";".join(["Jornada"] + teams)]
+    for round_number in range(1, n_rounds + 1):
+        points = np.random.default_rng([seed, round_number]).integers(0, 90, len(teams))
+        lines.append(";".join([f"J{round_number}"] + [str(value) for value in points]))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def write_market_csv(path, seed=0, teams=TEAMS):
+    months = ["Julio 2025", "Agosto 2025", "Septiembre 2025", "Octubre 2025"]
+    rng = np.random.default_rng(seed)
+    lines = [";".join(["Mes"] + teams)]
+    for month in months:
+        lines.append(";".join([month] + [str(value) for value in rng.integers(0, 30, len(teams))]))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+@pytest.fixture
+def league_dir(tmp_path):
+    """
+    A league with 10 rounds and market data.
+    """
+    dataset_dir = tmp_path / "dataset"
+    dataset_dir.mkdir()
+    write_points_csv(dataset_dir / "points.csv", 10)
+    write_market_csv(dataset_dir / "market.csv")
+    return tmp_path
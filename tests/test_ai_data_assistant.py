@@ -0,0 +1,92 @@
+import pytest
+
+from ai_data_assistant import OpenAIDataAssistant
+
+
+class APIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class StubClient:
+    """
+    Stand-in for the OpenAI client: raises the given errors first, then
+    answers with the number of the call.
+    """
+    def __init__(self, errors=()):
+        self.chat = self
+        self.completions = self
+        self.errors = list(errors)
+        self.prompts = []
+
+    def create(self, model, messages, temperature):
+        self.prompts.append(messages[-1]["content"])
+        if self.errors:
+            raise self.errors.pop(0)
+        message = type("Message", (), {"content": f" Respuesta {len(self.prompts)} "})()
+        return type("Response", (), {"choices": [type("Choice", (), {"message": message})()]})()
+
+
+def create_assistant(client, **options):
+    return OpenAIDataAssistant(api_token="token", open_ai_model="stub", client=client,
+                               backoff_seconds=0, **options)
+
+
+def test_retries_rate_limits_and_server_errors():
+    client = StubClient([APIError(429), APIError(503), ConnectionError()])
+
+    assert create_assistant(client).ask_insight("¿Quién va primero?") == "Respuesta 4"
+    assert len(client.prompts) == 4
+
+
+def test_client_errors_are_not_retried():
+    client = StubClient([APIError(401)])
+
+    with pytest.raises(APIError):
+        create_assistant(client).ask_insight("¿Quién va primero?")
+    assert len(client.prompts) == 1
+
+
+def test_gives_up_after_max_retries():
+    client = StubClient([APIError(500)] * 3)
+
+    with pytest.raises(APIError):
+        create_assistant(client, max_retries=2).ask_insight("¿Quién va primero?")
+    assert len(client.prompts) == 3
+
+
+def test_answers_are_cached_by_question_and_data(tmp_path):
+    client = StubClient()
+    cache_dir = str(tmp_path / "ai_cache")
+    assistant = create_assistant(client, cache_dir=cache_dir)
+
+    first = assistant.ask_insight("¿Quién va primero?", data={"teams": ["A", "B"]})
+    # Another assistant (e.g. the next run) reads the same cache
+    again = create_assistant(client, cache_dir=cache_dir).ask_insight(
+        "¿Quién va primero?", data={"teams": ["A", "B"]}
+    )
+    other_data = assistant.ask_insight("¿Quién va primero?", data={"teams": ["A", "C"]})
+
+    assert first == again == "Respuesta 1"
+    assert other_data == "Respuesta 2"
+    assert client.prompts[0] == '¿Quién va primero?: {"teams":["A","B"]}'
+
+
+def test_failed_requests_are_not_cached(tmp_path):
+    client = StubClient([APIError(400)])
+    assistant = create_assistant(client, cache_dir=str(tmp_path / "ai_cache"))
+
+    with pytest.raises(APIError):
+        assistant.ask_insight("¿Quién va primero?")
+
+    assert assistant.ask_insight("¿Quién va primero?") == "Respuesta 2"
+
+
+def test_ask_insights_keeps_the_question_order():
+    client = StubClient()
+    questions = ["Primera", {"question": "Segunda", "data": [1, 2]}, "Tercera"]
+
+    answers = create_assistant(client, max_concurrency=1).ask_insights(questions)
+
+    assert answers == ["Respuesta 1", "Respuesta 2", "Respuesta 3"]
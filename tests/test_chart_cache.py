@@ -0,0 +1,64 @@
+import os
+
+import pandas as pd
+
+from graficator import ChartCache, Graficator
+
+
+def set_last_used(cache, key, timestamp):
+    os.utime(os.path.join(cache.cache_dir, f"{key}.png"), (timestamp, timestamp))
+
+
+def test_put_evicts_the_least_recently_used_images(tmp_path):
+    cache = ChartCache(str(tmp_path / "chart_cache"), max_bytes=250)
+    cache.put("a", "a.png", b"a" * 100)
+    cache.put("b", "b.png", b"b" * 100)
+    set_last_used(cache, "a", 1000)
+    set_last_used(cache, "b", 2000)
+    # Reading an image makes it the most recently used one
+    assert cache.get("a") == ("a.png", b"a" * 100)
+
+    cache.put("c", "c.png", b"c" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == ("a.png", b"a" * 100)
+    assert cache.get("c") == ("c.png", b"c" * 100)
+    assert sorted(os.listdir(cache.cache_dir)) == ["a.png", "c.png", "manifest.json", "manifest.lock"]
+
+
+def test_put_keeps_the_new_image_even_over_max_bytes(tmp_path):
+    cache = ChartCache(str(tmp_path / "chart_cache"), max_bytes=50)
+    cache.put("a", "a.png", b"a" * 10)
+
+    cache.put("big", "big.png", b"x" * 100)
+
+    assert cache.get("a") is None
+    assert cache.get("big") == ("big.png", b"x" * 100)
+
+
+def test_put_removes_images_left_out_of_the_manifest(tmp_path):
+    cache = ChartCache(str(tmp_path / "chart_cache"))
+    os.makedirs(cache.cache_dir)
+    (tmp_path / "chart_cache" / "orphan.png").write_bytes(b"orphan")
+
+    cache.put("a", "a.png", b"a")
+
+    assert not (tmp_path / "chart_cache" / "orphan.png").exists()
+
+
+def test_graficator_reuses_the_cached_plot(tmp_path, monkeypatch):
+    df = pd.DataFrame({"round": [1, 1, 2, 2], "player": ["A", "B", "A", "B"],
+                       "position": [1, 2, 2, 1]})
+    graficator = Graficator(output_dir=str(tmp_path), save_to_disk=False)
+    image = graficator.plot_lines(df, value_column="position", reverse_y_axis=True)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The plot was drawn again")
+
+    monkeypatch.setattr("graficator.Figure", fail)
+    cached = Graficator(output_dir=str(tmp_path), save_to_disk=False).plot_lines(
+        df, value_column="position", reverse_y_axis=True
+    )
+
+    assert cached.name == image.name == "position_per_round_and_team.png"
+    assert cached.getvalue() == image.getvalue()
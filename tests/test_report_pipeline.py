@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from conftest import write_market_csv, write_points_csv
+from main import build_report_pipeline
+from service import OfflineAIClient
+
+CHARTS = {"chart.position", "chart.points", "chart.form", "chart.projection", "chart.market"}
+
+
+@pytest.fixture
+def run_report(league_dir):
+    def run(open_ai_api_token=None, save_chart_images=False):
+        """
+        :return: set - Names of the stages that were executed (not loaded from the cache).
+        """
+        pipeline, targets = build_report_pipeline(
+            str(league_dir / "dataset" / "points.csv"), str(league_dir / "generated_files"),
+            str(league_dir / "dataset" / "market.csv"), open_ai_api_token=open_ai_api_token,
+            save_chart_images=save_chart_images, open_ai_model="offline-stub",
+            ai_client=OfflineAIClient()
+        )
+        pipeline.run(targets)
+        return {name for name, status in pipeline.statuses.items() if status == "executed"}
+    return run
+
+
+def test_unchanged_inputs_execute_nothing(run_report):
+    assert CHARTS | {"slides", "report"} <= run_report()
+    assert run_report() == set()
+
+
+def test_market_change_only_rebuilds_the_market_stages(league_dir, run_report):
+    run_report()
+    write_market_csv(league_dir / "dataset" / "market.csv", seed=1)
+
+    assert run_report() == {"market_data", "chart.market", "slides", "report"}
+
+
+def test_new_round_does_not_rebuild_the_market_chart(league_dir, run_report):
+    run_report()
+    write_points_csv(league_dir / "dataset" / "points.csv", 11)
+
+    executed = run_report()
+
+    assert "chart.position" in executed and "report" in executed
+    assert "chart.market" not in executed and "market_data" not in executed
+
+
+def test_adding_the_ai_token_only_runs_the_ai_stages(run_report):
+    run_report()
+
+    executed = run_report(open_ai_api_token="token")
+
+    assert {"ai.highlights", "ai.trends", "ai.prediction", "ai.market"} <= executed
+    assert not executed & CHARTS
+    assert "text_rounds" not in executed
+    # Another token gives the same answers, nothing runs again
+    assert run_report(open_ai_api_token="another token") == set()
+
+
+def test_deleted_chart_image_is_rendered_again(league_dir, run_report):
+    run_report(save_chart_images=True)
+    os.remove(league_dir / "generated_files" / "rolling_mean_per_round_and_team.png")
+
+    executed = run_report(save_chart_images=True)
+
+    assert executed & CHARTS == {"chart.form"}
+    assert "report" not in executed
+    assert (league_dir / "generated_files" / "rolling_mean_per_round_and_team.png").exists()
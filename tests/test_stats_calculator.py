@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from conftest import write_points_csv
+from data_loader import load_points
+from stats_calculator import PointsStatsCalculator
+
+MATRICES = ("rounds", "round_points", "aggregated_points", "standings", "positions")
+
+
+def assert_same_stats(calculator, expected):
+    assert calculator.teams == expected.teams
+    for name in MATRICES:
+        np.testing.assert_array_equal(np.asarray(getattr(calculator, name)),
+                                      np.asarray(getattr(expected, name)), err_msg=name)
+
+
+@pytest.fixture
+def append_calls(monkeypatch):
+    calls = []
+    append_rounds = PointsStatsCalculator.append_rounds
+
+    def spy(self, rounds, round_points):
+        calls.append(list(rounds))
+        return append_rounds(self, rounds, round_points)
+
+    monkeypatch.setattr(PointsStatsCalculator, "append_rounds", spy)
+    return calls
+
+
+def test_from_state_with_new_rounds_matches_full_rebuild(tmp_path, append_calls):
+    state_path = str(tmp_path / "state.npz")
+    csv_path = write_points_csv(tmp_path / "points.csv", 6)
+    PointsStatsCalculator.from_state(load_points(csv_path), state_path=state_path).save_state(state_path)
+
+    write_points_csv(csv_path, 9)
+    points_data = load_points(csv_path)
+    calculator = PointsStatsCalculator.from_state(points_data, state_path=state_path)
+
+    assert append_calls == [[7, 8, 9]]
+    assert_same_stats(calculator, PointsStatsCalculator.from_matrix(*points_data))
+
+
+def test_from_state_rebuilds_when_a_saved_round_changed(tmp_path, append_calls):
+    state_path = str(tmp_path / "state.npz")
+    csv_path = write_points_csv(tmp_path / "points.csv", 6)
+    PointsStatsCalculator.from_state(load_points(csv_path), state_path=state_path).save_state(state_path)
+
+    rounds, teams, round_points = load_points(write_points_csv(csv_path, 8))
+    round_points = np.array(round_points)
+    round_points[2, 0] += 100
+    calculator = PointsStatsCalculator.from_state((rounds, teams, round_points), state_path=state_path)
+
+    assert append_calls == []
+    assert_same_stats(calculator, PointsStatsCalculator.from_matrix(rounds, teams, round_points))
+
+
+def test_from_state_with_unreadable_state_rebuilds(tmp_path):
+    state_path = tmp_path / "state.npz"
+    state_path.write_bytes(b"not a zip file")
+    points_data = load_points(write_points_csv(tmp_path / "points.csv", 5))
+
+    calculator = PointsStatsCalculator.from_state(points_data, state_path=str(state_path))
+
+    assert_same_stats(calculator, PointsStatsCalculator.from_matrix(*points_data))